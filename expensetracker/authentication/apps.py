@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        from . import backends  # noqa: F401, connects the user cache invalidation receivers
+        from expensetracker import sharding  # noqa: F401, removes a deleted user's rows from their shard
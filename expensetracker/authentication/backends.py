@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from expensetracker.checks import is_shared
+
+# Bump when cached User objects would no longer unpickle or match the model.
+CACHE_VERSION = 1
+CACHE_TIMEOUT = 60*60
+
+
+def user_cache():
+    return caches[getattr(settings, 'AUTH_USER_CACHE', 'default')]
+
+
+def cache_key(user_id):
+    return f'authuser:{user_id}'
+
+
+def forget_user(user_id):
+    cache = user_cache()
+    cache.delete(cache_key(user_id), version=CACHE_VERSION)
+    # And again once committed, in case a concurrent request cached the old row in between.
+    transaction.on_commit(lambda: cache.delete(cache_key(user_id), version=CACHE_VERSION))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Covers password changes (CompletePasswordReset saves the user), activation and last_login.
+    forget_user(instance.pk)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user(), run on every request that carries a session, is served from the cache.
+
+    Only a cache shared by all processes (AUTH_USER_CACHE) is used: with a per-process one, a
+    password changed through another process would leave the old user cached here.
+    """
+
+    def get_user(self, user_id):
+        cache = user_cache()
+        if not is_shared(cache):
+            return super().get_user(user_id)
+        user = cache.get(cache_key(user_id), version=CACHE_VERSION)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(cache_key(user_id), user, CACHE_TIMEOUT, version=CACHE_VERSION)
+        return user
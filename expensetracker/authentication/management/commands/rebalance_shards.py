@@ -0,0 +1,53 @@
+from collections import Counter
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from authentication.models import ShardAssignment
+from expensetracker import sharding
+
+
+class Command(BaseCommand):
+    help = "Move users' expenses, income, rollups and preferences to another shard while they stay online"
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='users to move, with --to')
+        parser.add_argument('--to', dest='target', help='shard alias to move the users to')
+        parser.add_argument('--spread', action='store_true',
+                            help='move every user whose shard differs from their hash placement over SHARDS')
+        parser.add_argument('--pin', metavar='ALIAS',
+                            help='record ALIAS for every user without an assignment, run before adding shards')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        aliases = sharding.shard_aliases()
+        if options['pin']:
+            if options['pin'] not in aliases:
+                raise CommandError(f"{options['pin']} is not in SHARDS")
+            users = User.objects.filter(shard__isnull=True).values_list('pk', flat=True)
+            pinned = ShardAssignment.objects.bulk_create(ShardAssignment(user_id=pk, alias=options['pin']) for pk in users)
+            self.stdout.write(f"Pinned {len(pinned)} users to {options['pin']}")
+            return
+
+        if options['spread']:
+            moves = [(user, sharding.hashed_shard(user.pk, aliases)) for user in User.objects.order_by('pk')]
+        elif options['usernames'] and options['target']:
+            if options['target'] not in aliases:
+                raise CommandError(f"{options['target']} is not in SHARDS")
+            users = User.objects.filter(username__in=options['usernames'])
+            if len(users) != len(set(options['usernames'])):
+                raise CommandError('Unknown username')
+            moves = [(user, options['target']) for user in users]
+        else:
+            raise CommandError('Give usernames and --to, --spread or --pin')
+
+        for user, target in moves:
+            source = sharding.shard_for(user.pk)
+            if source == target:
+                continue
+            copied = sharding.move_user(user.pk, target, batch_size=options['batch_size'])
+            if copied is None:
+                self.stderr.write(f'{user.username} kept writing, left on {source}')
+            else:
+                self.stdout.write(f'Moved {user.username} from {source} to {target} ({copied} rows)')
+
+        placement = Counter(ShardAssignment.objects.values_list('alias', flat=True))
+        self.stdout.write(', '.join(f'{alias}: {placement[alias]} users' for alias in aliases))
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from authentication import outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbox emails in batches over one connection, optionally forever'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=outbox.MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='keep polling instead of exiting when the outbox is empty')
+        parser.add_argument('--interval', type=float, default=5, help='seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = outbox.drain_all(batch_size=options['batch_size'], max_attempts=options['max_attempts'])
+            if sent:
+                self.stdout.write(f'Processed {sent} emails')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
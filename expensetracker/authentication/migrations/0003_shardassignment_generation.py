@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_shardassignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shardassignment',
+            name='generation',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
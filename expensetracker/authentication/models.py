@@ -1,3 +1,39 @@
 from django.db import models
-
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage
+from django.utils.timezone import now
 # Create your models here.
+
+class OutboxEmail(models.Model):
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    created_at = models.DateTimeField(default=now)
+    next_attempt_at = models.DateTimeField(default=now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self) -> str:
+        return f'{self.subject} -> {", ".join(self.to)}'
+
+    def to_message(self, connection=None):
+        return EmailMessage(self.subject, self.body, self.from_email or None, self.to, connection=connection)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_at', 'next_attempt_at'], name='outbox_pending_idx'),
+        ]
+
+
+class ShardAssignment(models.Model):
+    # Which SHARDS alias holds the user's rows, see expensetracker.sharding.
+    user = models.OneToOneField(to=User, on_delete=models.CASCADE, related_name='shard')
+    alias = models.CharField(max_length=100)
+    # Bumped by every write of the user's rows and by moves, see sharding.atomic().
+    generation = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'{self.user} -> {self.alias}'
@@ -0,0 +1,105 @@
+import datetime
+import logging
+import threading
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import close_old_connections, transaction
+from django.utils.timezone import now
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+POLL_INTERVAL = 30
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def enqueue(email):
+    """Persist an EmailMessage in the caller's transaction and wake the senders once it commits."""
+    item = OutboxEmail.objects.create(subject=email.subject, body=email.body, from_email=email.from_email or '', to=list(email.to))
+    transaction.on_commit(wake)
+    return item
+
+
+def backoff(attempts):
+    return datetime.timedelta(seconds=min(60 * 2 ** attempts, 3600))
+
+
+def drain(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """Send one batch of due emails over a single backend connection; returns how many were attempted."""
+    with transaction.atomic():
+        batch = list(OutboxEmail.objects
+                     .select_for_update(skip_locked=True)
+                     .filter(sent_at__isnull=True, attempts__lt=max_attempts, next_attempt_at__lte=now())
+                     .order_by('id')[:batch_size])
+        if not batch:
+            return 0
+
+        connection = get_connection()
+        try:
+            connection.open()
+            for item in batch:
+                try:
+                    connection.send_messages([item.to_message(connection)])
+                except Exception as ex:
+                    item.attempts += 1
+                    item.next_attempt_at = now() + backoff(item.attempts)
+                    item.last_error = repr(ex)
+                    logger.warning('Sending outbox email %s failed (attempt %d): %r', item.pk, item.attempts, ex)
+                else:
+                    item.attempts += 1
+                    item.sent_at = now()
+                    item.last_error = ''
+        except Exception as ex:
+            # Could not even connect; push the whole batch back.
+            for item in batch:
+                if item.sent_at is None:
+                    item.attempts += 1
+                    item.next_attempt_at = now() + backoff(item.attempts)
+                    item.last_error = repr(ex)
+            logger.warning('Outbox connection failed: %r', ex)
+        finally:
+            connection.close()
+
+        OutboxEmail.objects.bulk_update(batch, ['attempts', 'next_attempt_at', 'sent_at', 'last_error'])
+    return len(batch)
+
+
+def drain_all(**kwargs):
+    total = 0
+    while True:
+        sent = drain(**kwargs)
+        if not sent:
+            return total
+        total += sent
+
+
+def _worker():
+    while True:
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+        try:
+            drain_all()
+        except Exception:
+            logger.exception('Outbox worker failed')
+        finally:
+            close_old_connections()
+
+
+def start_workers():
+    """Start the fixed-size in-process sender pool (EMAIL_OUTBOX_WORKERS threads, 0 to disable)."""
+    with _workers_lock:
+        missing = getattr(settings, 'EMAIL_OUTBOX_WORKERS', 1) - len(_workers)
+        for _ in range(max(0, missing)):
+            worker = threading.Thread(target=_worker, name='email-outbox', daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def wake():
+    start_workers()
+    _wakeup.set()
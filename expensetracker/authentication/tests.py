@@ -1,3 +1,104 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail import EmailMessage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from expensetracker.checks import check_shared_caches
+from .models import OutboxEmail
+from . import outbox
 
 # Create your tests here.
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_OUTBOX_WORKERS=0)
+class OutboxTests(TestCase):
+
+    def enqueue(self, n):
+        for i in range(n):
+            outbox.enqueue(EmailMessage(f'Subject {i}', 'Body', 'noreply@semicolon.com', [f'user{i}@example.com']))
+
+    def test_enqueue_is_persisted_not_sent(self):
+        self.enqueue(2)
+        self.assertEqual(OutboxEmail.objects.filter(sent_at__isnull=True).count(), 2)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_drain_sends_in_batches_over_one_connection(self):
+        self.enqueue(5)
+        with mock.patch('authentication.outbox.get_connection', wraps=outbox.get_connection) as get_connection:
+            self.assertEqual(outbox.drain(batch_size=3), 3)
+            self.assertEqual(outbox.drain(batch_size=3), 2)
+            self.assertEqual(outbox.drain(batch_size=3), 0)
+        self.assertEqual(get_connection.call_count, 2)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(OutboxEmail.objects.filter(sent_at__isnull=True).exists())
+
+    def test_failures_are_retried_with_backoff(self):
+        self.enqueue(1)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            outbox.drain()
+        item = OutboxEmail.objects.get()
+        self.assertEqual(item.attempts, 1)
+        self.assertIsNone(item.sent_at)
+        self.assertIn('down', item.last_error)
+        # Not due yet, so nothing is picked up until the backoff passes.
+        self.assertEqual(outbox.drain(), 0)
+        OutboxEmail.objects.update(next_attempt_at=item.created_at)
+        self.assertEqual(outbox.drain(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+# The User is only cached in a cache the processes share.
+@override_settings(CACHES={**settings.CACHES, 'users': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                                        'LOCATION': os.path.join(tempfile.gettempdir(), 'expensetracker-test-users')}},
+                   AUTH_USER_CACHE='users', SESSION_ENGINE='django.contrib.sessions.backends.cached_db', SESSION_CACHE_ALIAS='users')
+class CachedAuthTests(TestCase):
+
+    def setUp(self):
+        caches['users'].clear()
+        self.user = User.objects.create_user('cached', 'cached@example.com', 'secret123')
+        self.client.force_login(self.user)
+
+    def test_warm_request_runs_no_queries(self):
+        self.client.get('/expense-category-summary')
+        with self.assertNumQueries(0):
+            response = self.client.get('/expense-category-summary')
+        self.assertEqual(response.status_code, 200)
+
+    def test_password_reset_ends_cached_sessions(self):
+        self.assertEqual(self.client.get('/').status_code, 200)
+        uid = urlsafe_base64_encode(force_bytes(self.user.pk))
+        token = PasswordResetTokenGenerator().make_token(self.user)
+        self.client.post(reverse('reset-user-password', args=[uid, token]), {'password1': 'changed123', 'password2': 'changed123'})
+        self.assertRedirects(self.client.get('/'), '/authentication/login?next=/', fetch_redirect_response=False)
+
+
+class LocalUserCacheTests(TestCase):
+
+    def test_session_ended_elsewhere_ends_it_here(self):
+        # Without a shared cache sessions are read from the database, so a logout handled by another process counts.
+        self.client.force_login(User.objects.create_user('away', 'away@example.com', 'secret123'))
+        self.assertEqual(self.client.get('/').status_code, 200)
+        Session.objects.all().delete()
+        self.assertRedirects(self.client.get('/'), '/authentication/login?next=/', fetch_redirect_response=False)
+
+    def test_deploy_check_covers_cached_sessions(self):
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            self.assertIn('SESSION_CACHE_ALIAS', [error.obj for error in check_shared_caches(None)])
+        self.assertNotIn('SESSION_CACHE_ALIAS', [error.obj for error in check_shared_caches(None)])
+
+    def test_password_changed_elsewhere_ends_the_session(self):
+        # With the default per-process cache the User is read from the database on every request.
+        user = User.objects.create_user('local', 'local@example.com', 'secret123')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/').status_code, 200)
+        user.set_password('changed123')
+        User.objects.filter(pk=user.pk).update(password=user.password)
+        self.assertRedirects(self.client.get('/'), '/authentication/login?next=/', fetch_redirect_response=False)
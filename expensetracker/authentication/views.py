@@ -13,7 +13,8 @@ from django.contrib.sites.shortcuts import get_current_site
 from .utils import token_generator
 from django.contrib import auth
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
-import threading
+from django.db import transaction
+from . import outbox
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from userpreferences.models import UserPreference
@@ -26,19 +27,6 @@ def create_default_preference(sender, instance, created, **kwargs):
     if created:
         UserPreference.objects.create(user=instance, currency ='INR')
 
-class EmailThread(threading.Thread):
-    
-    def __init__(self, email) -> None:
-        self.email = email
-        threading.Thread.__init__(self)
-
-
-    def run(self) -> None:
-        self.email.send(fail_silently=False)
-        
-
-
-
 
 class EmailValidationView(View):
     def post(self, request):
@@ -83,32 +71,33 @@ class RegistrationView(View):
                 if len(password) < 6:
                     messages.error(request, 'Password too short')
                     return render(request, 'authentication/register.html',context)
-                user = User.objects.create_user(username=username,email=email)
-                user.set_password(password)
-                user.is_active = False
-                user.save()
-
-                uid = urlsafe_base64_encode(force_bytes(user.pk))
-
-                domain = get_current_site(request).domain
-                email_contents = {
-                    'user': user,
-                    'domain': domain,
-                    'uid': uid,
-                    'token': token_generator.make_token(user),
-                }
-                link = reverse('activate', kwargs={'uid': email_contents['uid'], 'token': email_contents['token']})
-                activate_url = f'http://{domain}{link}'
-
-                email_subject = 'Activate your account.'
-                email_body = f'Hi {user.username}, Please use this link to verify your account.\n{activate_url}'
-                email = EmailMessage(
-                    email_subject,
-                    email_body,
-                    'noreply@semicolon.com',
-                    [email],
-                )
-                EmailThread(email).start()
+                with transaction.atomic():
+                    user = User.objects.create_user(username=username,email=email)
+                    user.set_password(password)
+                    user.is_active = False
+                    user.save()
+
+                    uid = urlsafe_base64_encode(force_bytes(user.pk))
+
+                    domain = get_current_site(request).domain
+                    email_contents = {
+                        'user': user,
+                        'domain': domain,
+                        'uid': uid,
+                        'token': token_generator.make_token(user),
+                    }
+                    link = reverse('activate', kwargs={'uid': email_contents['uid'], 'token': email_contents['token']})
+                    activate_url = f'http://{domain}{link}'
+
+                    email_subject = 'Activate your account.'
+                    email_body = f'Hi {user.username}, Please use this link to verify your account.\n{activate_url}'
+                    email = EmailMessage(
+                        email_subject,
+                        email_body,
+                        'noreply@semicolon.com',
+                        [email],
+                    )
+                    outbox.enqueue(email)
                 messages.success(request, 'Account created successfully')
                 return render(request, 'authentication/register.html')
 
@@ -207,7 +196,7 @@ class RequestPasswordResetEmail(View):
                 'noreply@semicolon.com',
                 [email],
                 )
-            EmailThread(email).start()
+            outbox.enqueue(email)
             messages.success(request, 'We have sent you an email to reset your password.')
             return render(request, 'authentication/reset_password.html')
         else:
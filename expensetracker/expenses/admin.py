@@ -1,8 +1,8 @@
 from django.contrib import admin
-from .models import Expense, Category, TotalExpense
+from .models import Expense, Category, TotalExpense, ArchivedExpense, Budget
 # Register your models here.
 class ExpenseAdmin(admin.ModelAdmin):
-    list_display = ('amount', 'description', 'owner', 'category', 'date',)
+    list_display = ('amount', 'currency', 'description', 'owner', 'category', 'date',)
     search_fields = ('description', 'category', 'date',)
 
     list_per_page = 5
@@ -10,4 +10,6 @@ class ExpenseAdmin(admin.ModelAdmin):
 
 admin.site.register(Expense, ExpenseAdmin)
 admin.site.register(Category)
-admin.site.register(TotalExpense)
\ No newline at end of file
+admin.site.register(TotalExpense)
+admin.site.register(ArchivedExpense)
+admin.site.register(Budget)
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""Cold storage for old Expense/UserIncome rows, filled by ``manage.py archive_ledger``.
+
+Archived rows stay counted in the TotalExpense/TotalIncome rollups, so stats do not change.
+Date-windowed reads (summaries, series, cash flow, exports and date searches) add the archive
+table whenever their window starts before the owner's archive horizon.
+"""
+import datetime
+from django.apps import apps
+from django.db import connections
+from django.db.models import Max
+from expensetracker import sharding
+from .versioning import bump_version
+
+BATCH_SIZE = 1000
+ARCHIVES = {
+    'expenses.expense': 'expenses.archivedexpense',
+    'userincome.userincome': 'userincome.archivedincome',
+}
+
+
+def archive_model(model):
+    return apps.get_model(ARCHIVES[model._meta.label_lower])
+
+
+def archive_horizon(model, owner_id):
+    """The day after the owner's newest archived row, or None when nothing is archived.
+
+    Read from the owner's primary every time: archive_ledger runs in another process, and one
+    index lookup is cheaper than keeping a copy anywhere in sync with it.
+    """
+    rows = archive_model(model).objects.using(sharding.primary_for(owner_id)).filter(owner_id=owner_id)
+    newest = rows.aggregate(newest=Max('date'))['newest']
+    return newest + datetime.timedelta(days=1) if newest else None
+
+
+def ledger(model, owner_id, date_from=None, date_to=None):
+    """The owner's rows in the window: the live queryset, plus the archived one if the window reaches it."""
+    window = {'owner_id': owner_id}
+    if date_from is not None:
+        window['date__gte'] = date_from
+    if date_to is not None:
+        window['date__lte'] = date_to
+    parts = [model.objects.filter(**window)]
+    horizon = archive_horizon(model, owner_id)
+    if horizon and (date_from is None or date_from < horizon):
+        parts.append(archive_model(model).objects.filter(**window))
+    return parts
+
+
+def archived_window(model, owner_id, date_from, date_to):
+    # Only an explicit window that starts before the horizon reads the archive.
+    if date_from is None:
+        return None
+    parts = ledger(model, owner_id, date_from, date_to)
+    return parts[1] if len(parts) > 1 else None
+
+
+def archive_rows(model, before, batch_size=BATCH_SIZE):
+    """Move rows dated before ``before`` into the archive table of the same shard, in batches."""
+    archive = archive_model(model)
+    fields = [field.attname for field in archive._meta.concrete_fields if field.attname not in ('id', 'archived_at')]
+    moved = 0
+    owners = set()
+    for alias in sharding.shard_aliases():
+        owners.update(model.objects.using(alias).filter(date__lt=before).order_by().values_list('owner_id', flat=True).distinct())
+    for owner_id in sorted(owners):
+        last = 0
+        while True:
+            # Per owner, holding their shard assignment so a concurrent move redoes its copy.
+            with sharding.atomic(owner_id) as alias:
+                connection = connections[alias]
+                batch = list(model.objects.using(alias).select_for_update()
+                             .filter(owner_id=owner_id, pk__gt=last, date__lt=before).order_by('pk').values('pk', *fields)[:batch_size])
+                if not batch:
+                    break
+                last = batch[-1]['pk']
+                archive.objects.using(alias).bulk_create(archive(**{field: row[field] for field in fields}) for row in batch)
+                # Plain DELETE: the delete receivers would take the amounts off the rollups, which keep counting them.
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+                                   f'WHERE {connection.ops.quote_name(model._meta.pk.column)} IN ({", ".join(["%s"] * len(batch))})',
+                                   [row['pk'] for row in batch])
+                bump_version(owner_id, using=alias)
+            moved += len(batch)
+    return moved
@@ -0,0 +1,75 @@
+import functools
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse, HttpResponseNotAllowed
+from userpreferences.currencies import currency_code
+from .archive import archived_window, ledger
+from .models import Expense
+from .resultcache import acached_result
+from .search import asearch_page, date_range, get_limit
+from .utils import get_date_window, asummarize_ledger
+from .versioning import aconditional_on_data, aconditional_on_date
+
+# Async twins of the read-only JSON endpoints in views.py, for deployments served over ASGI
+# (uvicorn/daphne with expensetracker.asgi). They run on the event loop with the async ORM and
+# answer like their twins: same login redirect, ETags, cached results and archived rows.
+
+
+def login_required(view):
+    """login_required(login_url='/authentication/login') for coroutine views, which Django wraps only from 5.0 on."""
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # request.user is resolved lazily from the session with sync queries.
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path(), '/authentication/login')
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def get_user_id(request):
+    return await sync_to_async(lambda: request.user.pk)()
+
+
+async def get_currency(request):
+    return await sync_to_async(lambda: currency_code(request.preferences.currency))()
+
+
+@login_required
+@aconditional_on_data
+async def search_expenses(request):
+    if request.method not in ('GET', 'POST'):
+        return HttpResponseNotAllowed(['GET', 'POST'])
+    # GET takes the same parameters in the query string, like the sync view; only GETs can get a 304.
+    body = json.loads(request.body) if request.method == 'POST' else request.GET
+    search_str = body.get('searchText', '')
+    owner_id = await get_user_id(request)
+    archived = await sync_to_async(archived_window)(Expense, owner_id, *(date_range(search_str) or (None, None)))
+    data = await asearch_page(Expense.objects.filter(owner_id=owner_id), ('description', 'category'), search_str,
+                              ('id', 'amount', 'currency', 'category', 'description', 'date'), get_limit(body.get('limit')), body.get('cursor'),
+                              archived)
+    return JsonResponse(data)
+
+# csrf_exempt() returns a sync wrapper before Django 5.0, so mark the coroutine directly.
+search_expenses.csrf_exempt = True
+
+
+@login_required
+@aconditional_on_date
+async def expense_category_summary(request):
+    try:
+        date_from, date_to = get_date_window(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date range, use ?from=YYYY-MM-DD&to=YYYY-MM-DD'}, status=400)
+    owner_id = await get_user_id(request)
+    currency = await get_currency(request)
+
+    async def summarize():
+        expenses = await sync_to_async(ledger)(Expense, owner_id, date_from, date_to)
+        unconverted = {}
+        return await asummarize_ledger(expenses, 'category', currency, unconverted), unconverted
+
+    # Same key and value as the sync view, so the two share cached results.
+    finalrep, unconverted = await acached_result(owner_id, 'expense_category_summary', (date_from, date_to, currency), summarize)
+    return JsonResponse({'expense_category_data': finalrep, 'unconverted': unconverted}, safe= False)
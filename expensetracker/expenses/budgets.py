@@ -0,0 +1,181 @@
+"""Monthly per-category budgets, checked incrementally on every expense write.
+
+BudgetSpend holds a running month-to-date counter per budget. Each write moves it with one
+UPDATE ... SET amount = amount + delta, like the rollups; a month is aggregated from the expenses
+only once, when its counter is first needed. Threshold alerts are claimed with a conditional
+UPDATE on ``alerted``, so concurrent writers alert once.
+"""
+import datetime
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from authentication import outbox
+from expensetracker import sharding
+from userpreferences.fx import conversion_factors
+from .models import Budget, BudgetSpend, Expense
+from .rollups import rollup_state
+from .utils import CENTS, amount_total, next_bucket
+
+DEFAULT_THRESHOLDS = (80, 100)
+
+
+class BudgetAlert:
+    def __init__(self, budget, month, threshold, spent):
+        self.budget = budget
+        self.month = month
+        self.threshold = threshold
+        self.spent = spent
+
+    def __str__(self):
+        return (f'{self.budget.category} spending for {self.month:%B %Y} reached {self.threshold}% of the budget: '
+                f'{self.spent} of {self.budget.amount} {self.budget.currency}')
+
+
+def thresholds():
+    return sorted(getattr(settings, 'BUDGET_ALERT_THRESHOLDS', DEFAULT_THRESHOLDS))
+
+
+def as_date(value):
+    # Freshly created instances may still hold the submitted string or the now() default.
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def month_start(day):
+    return as_date(day).replace(day=1)
+
+
+def get_budgets(owner_id):
+    """{category: Budget} for the owner, from their primary; a lagging replica could miss a new budget."""
+    return {budget.category: budget for budget in Budget.objects.using(sharding.primary_for(owner_id)).filter(owner_id=owner_id)}
+
+
+def level(budget, spent):
+    """The highest threshold ``spent`` has reached, 0 for none."""
+    percent = spent * 100 / budget.amount if budget.amount > 0 else Decimal('Infinity')
+    return max((threshold for threshold in thresholds() if percent >= threshold), default=0)
+
+
+def month_spend(budget, month, using):
+    total = (Expense.objects.using(using)
+             .filter(owner_id=budget.owner_id, category=budget.category, date__gte=month, date__lt=next_bucket(month, 'month'))
+             .aggregate(total=amount_total(budget.currency))['total'])
+    return Decimal(total or 0).quantize(CENTS)
+
+
+def seed(budget, month, using, alerted=None):
+    """Create the month's counter from the expenses already written, the current one included.
+
+    ``alerted`` defaults to the level already reached; writes pass 0 so they still alert on what they crossed.
+    """
+    spent = month_spend(budget, month, using)
+    try:
+        with transaction.atomic(using=using):
+            BudgetSpend.objects.using(using).create(owner_id=budget.owner_id, category=budget.category, month=month,
+                                                    amount=spent, alerted=level(budget, spent) if alerted is None else alerted)
+    except IntegrityError:
+        return False
+    return True
+
+
+def record(owner_id, category, day, currency, delta, using):
+    """Move the month's counter by an expense ``delta`` and return the BudgetAlert it caused, if any.
+
+    Expenses in a currency without a rate to the budget's cannot be counted and are skipped.
+    """
+    if not delta:
+        return None
+    # Read in the write's own transaction; a cached copy would miss budgets set through another process.
+    budget = Budget.objects.using(using).filter(owner_id=owner_id, category=category).first()
+    if budget is None:
+        return None
+    factor = conversion_factors(budget.currency).get(currency)
+    if factor is None:
+        return None
+    month = month_start(day)
+    counter = BudgetSpend.objects.using(using).filter(owner_id=owner_id, category=category, month=month)
+    if not counter.update(amount=F('amount') + (delta * factor).quantize(CENTS)):
+        # First write this month: the aggregate already counts this expense.
+        if not seed(budget, month, using, alerted=0):
+            # Lost the race to a concurrent first write.
+            counter.update(amount=F('amount') + (delta * factor).quantize(CENTS))
+    spent, alerted = counter.values_list('amount', 'alerted').first()
+    reached = level(budget, spent)
+    if reached > alerted and counter.filter(alerted=alerted).update(alerted=reached):
+        return BudgetAlert(budget, month, reached, spent)
+    if reached < alerted:
+        # Back under a threshold (an edit or delete), crossing it again alerts again.
+        counter.update(alerted=reached)
+    return None
+
+
+def tracks(model):
+    return model is Expense
+
+
+def after_save(instance, using):
+    """Count an expense write; called before rollups.after_save(), which replaces ``_rollup_state``."""
+    old = getattr(instance, '_rollup_state', None)
+    owner_id, category, currency, amount, day = rollup_state(instance, 'category')
+    if old and old[:3] == (owner_id, category, currency) and month_start(old[4]) == month_start(day):
+        alerts = [record(owner_id, category, day, currency, amount - old[3], using)]
+    else:
+        alerts = [record(old[0], old[1], old[4], old[2], -old[3], using)] if old else []
+        alerts.append(record(owner_id, category, day, currency, amount, using))
+    # Views turn these into messages.
+    instance.budget_alerts = [alert for alert in alerts if alert]
+    notify(owner_id, instance.budget_alerts, using)
+
+
+def after_delete(instance, using):
+    old = getattr(instance, '_rollup_state', None) or rollup_state(instance, 'category')
+    record(old[0], old[1], old[4], old[2], -old[3], using)
+
+
+def notify(owner_id, alerts, using):
+    if not alerts or not getattr(settings, 'BUDGET_ALERT_EMAIL', True):
+        return
+    email = User.objects.filter(pk=owner_id).values_list('email', flat=True).first()
+    if not email:
+        return
+    body = '\n'.join(str(alert) for alert in alerts)
+    # Queue it once the expense has committed.
+    transaction.on_commit(lambda: outbox.enqueue(EmailMessage('Budget alert', body, 'noreply@semicolon.com', [email])), using=using)
+
+
+def budget_changed(budget, deleted=False):
+    """Reset a budget's counters after it was set or removed; its current month is recounted once."""
+    using = budget._state.db
+    BudgetSpend.objects.using(using).filter(owner_id=budget.owner_id, category=budget.category).delete()
+    if not deleted:
+        # Spending that was already over a threshold when the budget was set does not alert.
+        seed(budget, month_start(datetime.date.today()), using)
+
+
+def status(owner_id, day=None):
+    """Every budget of the owner with this month's spend, read from the counters only."""
+    budgets = get_budgets(owner_id)
+    if not budgets:
+        return []
+    month = month_start(day or datetime.date.today())
+    spent = dict(BudgetSpend.objects.filter(owner_id=owner_id, month=month).values_list('category', 'amount'))
+    rows = []
+    for category, budget in sorted(budgets.items()):
+        amount = spent.get(category, Decimal('0.00'))
+        rows.append({
+            'category': category,
+            'month': month.isoformat(),
+            'currency': budget.currency,
+            'limit': budget.amount,
+            'spent': amount,
+            'remaining': budget.amount - amount,
+            'percent': round(float(amount * 100 / budget.amount), 1) if budget.amount > 0 else None,
+            'alerted': level(budget, amount),
+        })
+    return rows
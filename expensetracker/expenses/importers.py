@@ -0,0 +1,130 @@
+import csv
+import datetime
+import io
+import re
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from expensetracker import sharding
+from userpreferences.currencies import DEFAULT_CURRENCY
+from . import budgets, rollups
+from .utils import CENTS, MAX_AMOUNT
+from .versioning import bump_version
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+
+class UnreadableFile(Exception):
+    """The upload could not be decoded or parsed at all; nothing from it is imported."""
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.alerts = []
+
+    def add_error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'error': message})
+
+
+def parse_csv(upload, field):
+    """Yield (row_number, amount, description, <field>, date) from a CSV laid out like the exports."""
+    reader = csv.DictReader(io.TextIOWrapper(upload, encoding='utf-8-sig', newline=''))
+    try:
+        for row_number, row in enumerate(reader, start=2):
+            row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+            yield row_number, row.get('amount'), row.get('description'), row.get(field), row.get('date')
+    except UnicodeDecodeError:
+        raise UnreadableFile('The file is not UTF-8 text, save it as UTF-8 CSV and try again')
+    except csv.Error as ex:
+        raise UnreadableFile(f'The file is not a readable CSV: {ex}')
+
+
+def parse_ofx(upload, income):
+    """Yield STMTTRN entries from an OFX statement; debits for expenses, credits for income."""
+    transaction_fields = {}
+    number = 0
+    for line in io.TextIOWrapper(upload, encoding='utf-8-sig', errors='replace'):
+        for tag, value in re.findall(r'<(/?[A-Z0-9.]+)>([^<\r\n]*)', line, re.IGNORECASE):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                transaction_fields = {}
+            elif tag == '/STMTTRN':
+                number += 1
+                amount = transaction_fields.get('TRNAMT', '')
+                if amount.startswith('-') != income:
+                    yield (number, amount.lstrip('-+'),
+                           transaction_fields.get('MEMO') or transaction_fields.get('NAME'),
+                           None, transaction_fields.get('DTPOSTED', '')[:8])
+            elif not tag.startswith('/'):
+                transaction_fields[tag] = value.strip()
+
+
+def validate(amount, description, key, date, default_key):
+    """Return (Decimal amount, description, key, date) or raise ValueError with a readable message."""
+    try:
+        amount = Decimal(amount).quantize(CENTS)
+    except (TypeError, InvalidOperation):
+        amount = None
+    # NaN survives quantize() and would then fail the comparisons below.
+    if amount is None or not amount.is_finite():
+        raise ValueError('Amount is not a number')
+    if amount <= 0 or amount > MAX_AMOUNT:
+        raise ValueError('Amount must be greater than zero and fit 10 digits')
+    if not description:
+        raise ValueError('Description is required')
+    key = key or default_key
+    if not key:
+        raise ValueError('Category/source is required')
+    try:
+        date = datetime.date.fromisoformat(date) if '-' in (date or '') else datetime.datetime.strptime(date or '', '%Y%m%d').date()
+    except ValueError:
+        raise ValueError('Date must be YYYY-MM-DD')
+    return amount, description, key[:255], date
+
+
+def import_rows(model, total_model, field, owner, rows, default_key=None, currency=DEFAULT_CURRENCY, batch_size=BATCH_SIZE):
+    """Validate parsed rows and bulk_create them in batches, updating rollups once per batch."""
+    result = ImportResult()
+    batch = []
+
+    def flush(db):
+        model.objects.using(db).bulk_create(batch)
+        totals = defaultdict(Decimal)
+        for obj in batch:
+            totals[getattr(obj, field)] += obj.amount
+        for key, total in totals.items():
+            rollups.apply_delta(total_model, owner.pk, field, key, currency, total)
+        if budgets.tracks(model):
+            spend = defaultdict(Decimal)
+            for obj in batch:
+                spend[getattr(obj, field), budgets.month_start(obj.date)] += obj.amount
+            for (key, month), total in spend.items():
+                alert = budgets.record(owner.pk, key, month, currency, total, db)
+                if alert:
+                    result.alerts.append(alert)
+        result.created += len(batch)
+        batch.clear()
+
+    # Holds the owner's shard assignment to the end, so a concurrent move cannot strand the rows.
+    with sharding.atomic(owner.pk) as db:
+        for row_number, amount, description, key, date in rows:
+            try:
+                amount, description, key, date = validate(amount, description, key, date, default_key)
+            except ValueError as ex:
+                result.add_error(row_number, str(ex))
+                continue
+            batch.append(model(owner=owner, amount=amount, currency=currency, description=description, date=date, **{field: key}))
+            if len(batch) >= batch_size:
+                flush(db)
+        if batch:
+            flush(db)
+        if result.created:
+            # bulk_create skips the post_save receivers.
+            bump_version(owner.pk, using=db)
+            budgets.notify(owner.pk, result.alerts, db)
+    return result
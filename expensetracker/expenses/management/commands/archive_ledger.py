@@ -0,0 +1,28 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from expenses import archive
+from expenses.models import Expense
+from userincome.models import UserIncome
+
+
+class Command(BaseCommand):
+    help = 'Move expenses and income older than a cutoff into the archive tables, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', required=True,
+                            help='cutoff as a number of days back from today, or a YYYY-MM-DD date')
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        value = options['older_than']
+        try:
+            if value.isdigit():
+                before = datetime.date.today() - datetime.timedelta(days=int(value))
+            else:
+                before = datetime.date.fromisoformat(value)
+        except ValueError:
+            raise CommandError('--older-than takes a number of days or a YYYY-MM-DD date')
+
+        for model in (Expense, UserIncome):
+            moved = archive.archive_rows(model, before, options['batch_size'])
+            self.stdout.write(f'Archived {moved} {model._meta.verbose_name_plural} dated before {before}')
@@ -0,0 +1,108 @@
+import json
+import statistics
+import time
+import tracemalloc
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+# name -> (method, path, body)
+ENDPOINTS = {
+    'expenses.index': ('get', '/', None),
+    'expenses.search_expenses': ('post', '/search-expenses', {'searchText': 'food'}),
+    'expenses.expense_category_summary': ('get', '/expense-category-summary', None),
+    'expenses.stats_view': ('get', '/stats', None),
+    'expenses.export_csv': ('get', '/export-csv', None),
+    'userincome.index': ('get', '/income/', None),
+    'userincome.search_income': ('post', '/income/search-income', {'searchText': 'salary'}),
+    'userincome.income_source_summary': ('get', '/income/income-source-summary', None),
+    'userincome.stats_view': ('get', '/income/stats', None),
+    'userincome.export_csv': ('get', '/income/export-csv', None),
+}
+
+
+def percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+class Command(BaseCommand):
+    help = 'Time the main views through the test client and print latency, query counts and peak memory as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='username to log in as, e.g. one created by seed_data')
+        parser.add_argument('--requests', type=int, default=50, help='timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS), help='limit to these endpoints')
+        parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+
+    def call(self, client, method, path, body):
+        if method == 'post':
+            response = client.post(path, json.dumps(body), content_type='application/json')
+        else:
+            response = client.get(path)
+        if getattr(response, 'streaming', False):
+            for _ in response.streaming_content:
+                pass
+        if response.status_code >= 400:
+            raise CommandError(f'{path} returned {response.status_code}')
+        return response
+
+    def measure(self, client, method, path, body, options):
+        for _ in range(options['warmup']):
+            self.call(client, method, path, body)
+
+        timings = []
+        for _ in range(options['requests']):
+            start = time.perf_counter()
+            self.call(client, method, path, body)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # request_started clears the query log, so start the capture from an empty one.
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            self.call(client, method, path, body)
+
+        tracemalloc.start()
+        self.call(client, method, path, body)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            'requests': len(timings),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': len(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']}, create one with seed_data")
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1')
+
+        client = Client(SERVER_NAME='localhost')
+        client.force_login(user)
+
+        report = {
+            'user': user.username,
+            'database': connection.vendor,
+            'endpoints': {},
+        }
+        for name in options['endpoint'] or ENDPOINTS:
+            method, path, body = ENDPOINTS[name]
+            report['endpoints'][name] = self.measure(client, method, path, body, options)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
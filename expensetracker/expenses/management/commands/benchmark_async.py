@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+# name -> (method, sync path, async path, body)
+ENDPOINTS = {
+    'search_expenses': ('post', '/search-expenses', '/async/search-expenses', {'searchText': 'food'}),
+    'expense_category_summary': ('get', '/expense-category-summary', '/async/expense-category-summary', None),
+    'search_income': ('post', '/income/search-income', '/income/async/search-income', {'searchText': 'salary'}),
+    'income_source_summary': ('get', '/income/income-source-summary', '/income/async/income-source-summary', None),
+}
+
+
+def check(path, response):
+    if response.status_code >= 400:
+        raise CommandError(f'{path} returned {response.status_code}')
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent throughput of the sync (WSGI) JSON endpoints against their async (ASGI) twins'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='username to log in as, e.g. one created by seed_data')
+        parser.add_argument('--requests', type=int, default=200, help='requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=16, help='requests in flight at once')
+        parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS), help='limit to these endpoints')
+        parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+
+    def run_sync(self, user, method, path, body, options):
+        local = threading.local()
+
+        def login():
+            local.client = Client(SERVER_NAME='localhost')
+            local.client.force_login(user)
+
+        def call(_):
+            if method == 'post':
+                response = local.client.post(path, json.dumps(body), content_type='application/json')
+            else:
+                response = local.client.get(path)
+            check(path, response)
+
+        with ThreadPoolExecutor(max_workers=options['concurrency'], initializer=login) as pool:
+            # Start the workers (and their logins) before the clock does.
+            list(pool.map(lambda _: None, range(options['concurrency'])))
+            start = time.perf_counter()
+            list(pool.map(call, range(options['requests'])))
+            elapsed = time.perf_counter() - start
+        return elapsed
+
+    def run_async(self, user, method, path, body, options):
+        client = AsyncClient()
+        client.force_login(user)
+        slots = asyncio.Semaphore(options['concurrency'])
+
+        async def call():
+            async with slots:
+                if method == 'post':
+                    response = await client.post(path, json.dumps(body), content_type='application/json')
+                else:
+                    response = await client.get(path)
+                check(path, response)
+
+        async def run():
+            start = time.perf_counter()
+            await asyncio.gather(*(call() for _ in range(options['requests'])))
+            return time.perf_counter() - start
+
+        return asyncio.run(run())
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']}, create one with seed_data")
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be at least 1')
+
+        report = {
+            'user': user.username,
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'endpoints': {},
+        }
+        for name in options['endpoint'] or ENDPOINTS:
+            method, sync_path, async_path, body = ENDPOINTS[name]
+            wsgi = self.run_sync(user, method, sync_path, body, options)
+            # AsyncClient always sends Host: testserver.
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                asgi = self.run_async(user, method, async_path, body, options)
+            report['endpoints'][name] = {
+                'wsgi_rps': round(options['requests'] / wsgi, 1),
+                'asgi_rps': round(options['requests'] / asgi, 1),
+            }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,15 @@
+import json
+from django.core.management.base import BaseCommand
+from expenses.resultcache import cache_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Print hit/miss counters of the aggregate result cache as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(cache_stats(), indent=2))
+        if options['reset']:
+            reset_stats()
@@ -0,0 +1,94 @@
+import datetime
+import random
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from expenses.models import Category, Expense, TotalExpense
+from expenses.rollups import rebuild
+from userincome.models import Source, UserIncome, TotalIncome
+from userpreferences.models import UserPreference
+
+CATEGORIES = ['Food', 'Rent', 'Travel', 'Utilities', 'Health', 'Entertainment', 'Shopping', 'Education']
+SOURCES = ['Salary', 'Freelance', 'Interest', 'Dividends', 'Gifts']
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, expenses and income with bulk_create for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--expenses', type=int, default=1000, help='expenses per user')
+        parser.add_argument('--income', type=int, default=100, help='income rows per user')
+        parser.add_argument('--days', type=int, default=3*365, help='spread dates over this many days back from today')
+        parser.add_argument('--skew', type=float, default=1.0, help='Zipf exponent for category/source popularity, 0 is uniform')
+        parser.add_argument('--prefix', default='seed', help='username prefix')
+        parser.add_argument('--password', default='seedpass123')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None, help='random seed for reproducible data')
+
+    def weights(self, count, skew):
+        return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+    def rows(self, model, field, keys, owners, per_user, options, rng):
+        weights = self.weights(len(keys), options['skew'])
+        today = datetime.date.today()
+        for owner in owners:
+            keys_for_user = rng.choices(keys, weights, k=per_user)
+            for key in keys_for_user:
+                yield model(
+                    owner=owner,
+                    amount=Decimal(rng.randint(100, 50000)) / 100,
+                    description=f'{key.lower()} {rng.randint(1, 9999)}',
+                    date=today - datetime.timedelta(days=rng.randrange(options['days'])),
+                    **{field: key},
+                )
+
+    def bulk_insert(self, model, objects, batch_size, using):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                model.objects.using(using).bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.using(using).bulk_create(batch)
+
+    def next_suffix(self, prefix):
+        # Past the highest "<prefix><n>" rather than a count, which deleted users would make collide.
+        names = User.objects.filter(username__startswith=prefix).values_list('username', flat=True)
+        suffixes = [int(name[len(prefix):]) for name in names if name[len(prefix):].isdigit()]
+        return max(suffixes, default=-1) + 1
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        rng = random.Random(options['seed'])
+        password = make_password(options['password'])
+        prefix = options['prefix']
+
+        with transaction.atomic():
+            for name in CATEGORIES:
+                Category.objects.get_or_create(name=name)
+            for name in SOURCES:
+                Source.objects.get_or_create(name=name)
+
+            start = self.next_suffix(prefix)
+            usernames = [f'{prefix}{start + i}' for i in range(options['users'])]
+            User.objects.bulk_create(User(username=name, email=f'{name}@example.com', password=password) for name in usernames)
+            owners = list(User.objects.filter(username__in=usernames))
+
+            for owner in owners:
+                # bulk_create gives the router no owner to go by, ask for the owner's shard up front.
+                db = router.db_for_write(Expense, owner_id=owner.pk)
+                UserPreference.objects.using(db).create(user=owner, currency='INR')
+                self.bulk_insert(Expense, self.rows(Expense, 'category', CATEGORIES, [owner], options['expenses'], options, rng), options['batch_size'], db)
+                self.bulk_insert(UserIncome, self.rows(UserIncome, 'source', SOURCES, [owner], options['income'], options, rng), options['batch_size'], db)
+                rebuild(TotalExpense, Expense, 'category', owner)
+                rebuild(TotalIncome, UserIncome, 'source', owner)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(owners)} '{prefix}' users with "
+            f"{options['expenses']} expenses and {options['income']} income rows each"
+        ))
@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import Sum
+
+
+def rebuild_total_expense(apps, schema_editor):
+    # Earlier totals were accumulated with int() and re-added on every edit.
+    # Rollups gained a currency key later, so this step keeps its own copy of the old rebuild.
+    TotalExpense = apps.get_model('expenses', 'TotalExpense')
+    rows = apps.get_model('expenses', 'Expense').objects.order_by().values('owner_id', 'category').annotate(total=Sum('amount'))
+    TotalExpense.objects.all().delete()
+    TotalExpense.objects.bulk_create(TotalExpense(owner_id=row['owner_id'], amount=row['total'], category=row['category']) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0004_alter_expense_amount'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_total_expense, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+from expenses.search import create_search_index, drop_search_index
+
+
+def forwards(apps, schema_editor):
+    create_search_index(schema_editor, 'expenses_expense', ('description', 'category'))
+
+
+def backwards(apps, schema_editor):
+    drop_search_index(schema_editor, 'expenses_expense')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_rebuild_totalexpense'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
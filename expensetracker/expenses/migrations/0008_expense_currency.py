@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:45
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def rebuild(model, source, field):
+    # Its own copy of rollups.rebuild as it was here: the live one also reads tables added later.
+    rows = source.objects.order_by().values('owner_id', field, 'currency').annotate(total=Sum('amount'))
+    model.objects.all().delete()
+    model.objects.bulk_create(model(owner_id=row['owner_id'], amount=row['total'], currency=row['currency'], **{field: row[field]})
+                              for row in rows)
+
+
+def backfill_expense_currency(apps, schema_editor):
+    # Amounts were entered in whatever currency the owner had picked, so stamp them with it.
+    Expense = apps.get_model('expenses', 'Expense')
+    for user_id, currency in apps.get_model('userpreferences', 'UserPreference').objects.exclude(currency__isnull=True).exclude(currency='').values_list('user_id', 'currency'):
+        Expense.objects.filter(owner_id=user_id).update(currency=currency.partition(' - ')[0])
+    rebuild(apps.get_model('expenses', 'TotalExpense'), Expense, 'category')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userpreferences', '0001_initial'),
+        ('expenses', '0007_expense_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='totalexpense',
+            name='unique_total_expense',
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='totalexpense',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.RunPython(backfill_expense_currency, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='totalexpense',
+            constraint=models.UniqueConstraint(fields=('owner', 'category', 'currency'), name='unique_total_expense'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from expenses.search import create_search_index, drop_search_index
+
+
+def restore_search_index(apps, schema_editor):
+    # Dropping the owner constraint rebuilds the table on SQLite, and with it the FTS triggers.
+    if schema_editor.connection.vendor == 'sqlite':
+        drop_search_index(schema_editor, 'expenses_expense')
+        create_search_index(schema_editor, 'expenses_expense', ('description', 'category'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('expenses', '0009_restore_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expense',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='totalexpense',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='expenses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(restore_search_index, restore_search_index),
+    ]
@@ -1,19 +1,32 @@
 from django.db import models
 from django.utils.timezone import now
 from django.contrib.auth.models import User
+from userpreferences.currencies import DEFAULT_CURRENCY
+from .rollups import remember_state
 # Create your models here.
 class Expense(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField(default=now)
     description = models.TextField()
-    owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, db_constraint=False)
     category = models.CharField(max_length=255)
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
 
     def __str__(self) -> str:
         return self.category
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        remember_state(instance, 'category', field_names)
+        return instance
+
     class Meta:
-        ordering = ['-date']
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['owner', '-date', '-id'], name='expense_owner_date_idx'),
+            models.Index(fields=['owner', 'category', 'date'], name='expense_owner_category_idx'),
+        ]
 
 class Category(models.Model):
     name = models.CharField(max_length=255)
@@ -27,8 +40,67 @@ class Category(models.Model):
 
 class TotalExpense(models.Model):
     category = models.CharField(max_length=255)
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='expenses', db_constraint=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'category', 'currency'], name='unique_total_expense'),
+        ]
+
+    def __str__(self):
+        return f'{self.category} - {self.amount} - {self.owner}'
+
+
+class ArchivedExpense(models.Model):
+    # Old rows moved out of the live table by ``manage.py archive_ledger``, see expenses.archive.
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='expenses')
+    date = models.DateField()
+    description = models.TextField()
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, db_constraint=False)
+    category = models.CharField(max_length=255)
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+    archived_at = models.DateTimeField(default=now)
+
+    class Meta:
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['owner', '-date', '-id'], name='expense_archive_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.category} - {self.amount} - {self.date}'
+
+
+class Budget(models.Model):
+    # Monthly spending limit for one category, checked on every expense write, see expenses.budgets.
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, db_constraint=False)
+    category = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'category'], name='unique_budget'),
+        ]
+
+    def __str__(self):
+        return f'{self.category} - {self.amount} {self.currency} - {self.owner}'
+
+
+class BudgetSpend(models.Model):
+    # Running month-to-date spend of one budget in its currency, and the highest threshold alerted.
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, db_constraint=False)
+    category = models.CharField(max_length=255)
+    month = models.DateField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    alerted = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'month', 'category'], name='unique_budget_spend'),
+        ]
 
     def __str__(self):
-        return f'{self.category} - {self.amount} - {self.owner}'
\ No newline at end of file
+        return f'{self.category} {self.month:%Y-%m} - {self.amount} - {self.owner}'
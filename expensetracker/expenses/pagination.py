@@ -0,0 +1,74 @@
+import base64
+import datetime
+from django.db.models import Q
+
+PAGE_SIZES = (5, 10, 25, 50, 100)
+DEFAULT_PAGE_SIZE = 5
+
+
+def encode_cursor(direction, obj):
+    raw = f'{direction}:{obj.date.isoformat()}:{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (direction, date, pk) for an opaque cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, date, pk = raw.split(':')
+        date, pk = datetime.date.fromisoformat(date), int(pk)
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as ex:
+        raise ValueError('Invalid cursor') from ex
+    if direction not in ('next', 'prev'):
+        raise ValueError('Invalid cursor')
+    return direction, date, pk
+
+
+def get_page_size(request):
+    try:
+        per_page = int(request.GET.get('per_page', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+    return per_page if per_page in PAGE_SIZES else DEFAULT_PAGE_SIZE
+
+
+class KeysetPage:
+    """One page of a (-date, -id) ordered queryset, addressed by cursors instead of offsets."""
+
+    def __init__(self, object_list, per_page, has_next, has_previous):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return encode_cursor('next', self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return encode_cursor('prev', self.object_list[0])
+
+
+def keyset_page(queryset, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """Fetch ``per_page`` rows after/before ``cursor`` with a seek predicate, no COUNT or OFFSET."""
+    direction, date, pk = decode_cursor(cursor) if cursor else ('next', None, None)
+
+    if direction == 'prev':
+        rows = list(queryset.filter(Q(date__gt=date) | Q(date=date, pk__gt=pk)).order_by('date', 'id')[:per_page + 1])
+        has_previous = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], per_page, True, has_previous)
+
+    queryset = queryset.order_by('-date', '-id')
+    if date is not None:
+        queryset = queryset.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))
+    rows = list(queryset[:per_page + 1])
+    return KeysetPage(rows[:per_page], per_page, len(rows) > per_page, cursor is not None)
@@ -0,0 +1,51 @@
+import datetime
+from django.conf import settings
+from django.core.cache import caches
+
+# Writes allowed per user per day, by scope. Override with RATE_LIMITS in settings.
+DEFAULT_RATE_LIMITS = {
+    'expense': 10,
+    'import': 20,
+}
+
+
+def get_limit(scope):
+    return getattr(settings, 'RATE_LIMITS', DEFAULT_RATE_LIMITS).get(scope)
+
+
+def seconds_until_tomorrow(now=None):
+    now = now or datetime.datetime.now()
+    tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+def consume(user_id, scope, amount=1):
+    """Take ``amount`` from today's quota for ``scope``.
+
+    Returns None when allowed, otherwise the number of seconds until the quota resets.
+    Counters are atomic cache increments, so no database query is involved.
+    """
+    limit = get_limit(scope)
+    if limit is None:
+        return None
+    cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+    now = datetime.datetime.now()
+    key = f'quota:{scope}:{user_id}:{now.date().isoformat()}'
+    ttl = seconds_until_tomorrow(now)
+    cache.add(key, 0, ttl + 60)
+    try:
+        used = cache.incr(key, amount)
+    except ValueError:
+        # Evicted between add() and incr(); start the day over.
+        cache.add(key, amount, ttl + 60)
+        used = amount
+    if used > limit:
+        cache.decr(key, amount)
+        return ttl
+    return None
+
+
+def limited_response(response, retry_after):
+    response.status_code = 429
+    response['Retry-After'] = str(retry_after)
+    return response
@@ -0,0 +1,91 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from userpreferences.fx import rates_version
+from .versioning import get_version
+
+# Names passed to cached_result(); listed so their counters can be read without scanning keys.
+RESULT_NAMES = (
+    'expense_category_summary',
+    'income_source_summary',
+    'expense_stats',
+    'income_stats',
+)
+
+
+def result_cache():
+    return caches[getattr(settings, 'RESULT_CACHE', 'default')]
+
+
+def counter_key(name, outcome):
+    return f'resultstats:{name}:{outcome}'
+
+
+def count(name, outcome):
+    # Kept next to the results, so with a shared RESULT_CACHE the counts cover every process.
+    cache = result_cache()
+    key = counter_key(name, outcome)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr().
+        cache.add(key, 1, None)
+
+
+def result_key(user_id, name, params):
+    return ':'.join(['results', str(user_id), str(get_version(user_id)), str(rates_version()), name,
+                     *map(str, params)])
+
+
+def cached_result(user_id, name, params, compute):
+    """``compute()`` for the user's current data generation, served from the result cache when possible.
+
+    The key embeds the data-version stamp (see expenses.versioning) and the FX table version, so
+    a write or a rate change makes older entries unreachable; they age out by TTL or LRU eviction.
+    """
+    cache = result_cache()
+    key = result_key(user_id, name, params)
+    value = cache.get(key)
+    if value is None:
+        count(name, 'misses')
+        value = compute()
+        # TTL and size bounds come from the cache alias (TIMEOUT, MAX_ENTRIES).
+        cache.set(key, value)
+    else:
+        count(name, 'hits')
+    return value
+
+
+async def acached_result(user_id, name, params, compute):
+    """cached_result() for async views, ``compute`` being a coroutine function; shares its entries."""
+    cache = result_cache()
+    key = await sync_to_async(result_key)(user_id, name, params)
+    value = await cache.aget(key)
+    if value is None:
+        await sync_to_async(count)(name, 'misses')
+        value = await compute()
+        await cache.aset(key, value)
+    else:
+        await sync_to_async(count)(name, 'hits')
+    return value
+
+
+def cache_stats():
+    cache = result_cache()
+    keys = [counter_key(name, outcome) for name in RESULT_NAMES for outcome in ('hits', 'misses')]
+    counters = cache.get_many(keys)
+    stats = {}
+    for name in RESULT_NAMES:
+        hits = counters.get(counter_key(name, 'hits'), 0)
+        misses = counters.get(counter_key(name, 'misses'), 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return stats
+
+
+def reset_stats():
+    result_cache().delete_many([counter_key(name, outcome) for name in RESULT_NAMES for outcome in ('hits', 'misses')])
@@ -0,0 +1,89 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Sum
+from expensetracker import sharding
+from .archive import archive_model
+
+
+def rollup_state(instance, field):
+    # (owner, key, currency, amount, date); the date is for the monthly budget counters.
+    return (instance.owner_id, getattr(instance, field), instance.currency, Decimal(str(instance.amount)), instance.date)
+
+
+def remember_state(instance, field, field_names):
+    # Called from Model.from_db so edits and deletes know what the row held before.
+    if {'owner_id', field, 'currency', 'amount', 'date'}.issubset(field_names):
+        instance._rollup_state = rollup_state(instance, field)
+
+
+def apply_delta(model, owner_id, field, key, currency, delta, create=True):
+    """Add a signed ``delta`` to one rollup row with an UPDATE ... SET amount = amount + delta.
+
+    Rollups are kept per original currency; conversion happens when they are read.
+    """
+    if not delta:
+        return
+    # The owner's shard, wherever this is called from.
+    totals = model.objects.db_manager(router.db_for_write(model, owner_id=owner_id))
+    lookup = {'owner_id': owner_id, field: key, 'currency': currency}
+    if totals.filter(**lookup).update(amount=F('amount') + delta) or not create:
+        return
+    try:
+        with transaction.atomic(using=totals.db):
+            totals.create(amount=delta, **lookup)
+    except IntegrityError:
+        # Lost a race with a concurrent first write for the same key.
+        totals.filter(**lookup).update(amount=F('amount') + delta)
+
+
+def before_save(instance, field):
+    if instance._state.adding or hasattr(instance, '_rollup_state'):
+        return
+    # Instance loaded with deferred fields, read the stored row once.
+    row = type(instance).objects.db_manager(router.db_for_read(type(instance), instance=instance)).filter(pk=instance.pk).values_list('owner_id', field, 'currency', 'amount', 'date').first()
+    if row:
+        instance._rollup_state = row
+
+
+def after_save(model, instance, field):
+    old = getattr(instance, '_rollup_state', None)
+    new = rollup_state(instance, field)
+    with transaction.atomic(using=instance._state.db):
+        if old and old[:3] != new[:3]:
+            apply_delta(model, old[0], field, old[1], old[2], -old[3], create=False)
+            apply_delta(model, new[0], field, new[1], new[2], new[3])
+        else:
+            apply_delta(model, new[0], field, new[1], new[2], new[3] - (old[3] if old else 0))
+    instance._rollup_state = new
+
+
+def after_delete(model, instance, field):
+    old = getattr(instance, '_rollup_state', None) or rollup_state(instance, field)
+    apply_delta(model, old[0], field, old[1], old[2], -old[3], create=False)
+
+
+def rebuild(model, source, field, owner=None):
+    """Recompute rollup rows from scratch, e.g. after bulk edits that skipped the signals.
+
+    Archived rows are counted too, the rollups keep them (see expenses.archive).
+    """
+    owner_id = getattr(owner, 'pk', owner)
+    # One owner's rebuild holds their shard assignment, see sharding.atomic().
+    with sharding.atomic(owner_id) if owner_id is not None else transaction.atomic(using=router.db_for_write(model)):
+        db = router.db_for_write(model, owner_id=owner_id)
+        sums = defaultdict(Decimal)
+        for table in (source, archive_model(source)):
+            rows = table.objects.using(db).order_by().values('owner_id', field, 'currency').annotate(total=Sum('amount'))
+            if owner is not None:
+                rows = rows.filter(owner_id=owner_id)
+            for row in rows:
+                sums[row['owner_id'], row[field], row['currency']] += row['total']
+        totals = model.objects.using(db)
+        if owner is not None:
+            totals = totals.filter(owner_id=owner_id)
+        totals.delete()
+        model.objects.using(db).bulk_create(
+            model(owner_id=key[0], amount=total, currency=key[2], **{field: key[1]})
+            for key, total in sums.items()
+        )
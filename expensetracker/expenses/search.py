@@ -0,0 +1,220 @@
+import base64
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import BooleanField, Case, F, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from .utils import CENTS, MAX_AMOUNT
+
+DEFAULT_LIMIT = 25
+MAX_LIMIT = 100
+MAX_OFFSET = 10*MAX_LIMIT
+
+
+def get_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def date_range(text):
+    """(start, end) for an ISO date prefix like 2024, 2024-03 or 2024-03-15, else None."""
+    match = re.fullmatch(r'(\d{4})(?:-(\d{2})(?:-(\d{2}))?)?', text.strip())
+    if not match:
+        return None
+    year, month, day = (int(part) if part else None for part in match.groups())
+    try:
+        if day:
+            return datetime.date(year, month, day), datetime.date(year, month, day)
+        if month:
+            start = datetime.date(year, month, 1)
+            return start, (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)
+        return datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+    except ValueError:
+        return None
+
+
+def structured_match(text):
+    """Amounts and ISO date prefixes are matched on the indexed columns instead of as text."""
+    condition = Q(pk__in=[])
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        amount = None
+    # Only amounts the column can hold (max_digits=10, decimal_places=2); the field rejects NaN,
+    # Infinity and anything wider instead of matching nothing.
+    if amount is not None and amount.is_finite() and abs(amount) <= MAX_AMOUNT and amount == amount.quantize(CENTS):
+        condition |= Q(amount=amount)
+    dates = date_range(text)
+    if dates:
+        condition |= Q(date__gte=dates[0], date__lte=dates[1])
+    return condition
+
+
+class SearchBackend:
+    """Portable fallback: icontains over the text fields, no ranking."""
+
+    def text_match(self, queryset, fields, text, limit):
+        """Return (queryset, condition, rank) for the free-text part of the search."""
+        condition = Q(pk__in=[])
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': text})
+        return queryset, condition, Value(0.0, output_field=FloatField())
+
+    def search(self, queryset, fields, text, limit=DEFAULT_LIMIT):
+        text = text.strip()
+        if not text:
+            return queryset.none()
+        queryset, condition, rank = self.text_match(queryset, fields, text, limit)
+        return (queryset
+                .alias(search_rank=rank)
+                .filter(condition | structured_match(text))
+                .order_by(F('search_rank').desc(nulls_last=True), '-date', '-id')[:limit])
+
+
+class PostgresSearchBackend(SearchBackend):
+    """pg_trgm ILIKE/similarity over the text fields, served by the GIN trigram index."""
+
+    def text_match(self, queryset, fields, text, limit):
+        table = queryset.model._meta.db_table
+        # Must stay identical to the indexed expression in the search migrations.
+        document = " || ' ' || ".join(f'"{table}"."{field}"' for field in fields)
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', text) + '%'
+        queryset = queryset.alias(search_match=RawSQL(f'({document}) ILIKE %s', (pattern,), output_field=BooleanField()))
+        rank = RawSQL(f'similarity({document}, %s)', (text,), output_field=FloatField())
+        return queryset, Q(search_match=True), rank
+
+
+class SqliteSearchBackend(SearchBackend):
+    """FTS5 prefix search against the <table>_fts index kept in sync by triggers."""
+
+    def text_match(self, queryset, fields, text, limit):
+        query = ' '.join('"%s"*' % token for token in re.findall(r'\w+', text))
+        if not query:
+            return super().text_match(queryset, fields, text, limit)
+        table = queryset.model._meta.db_table
+        fts = f'{table}_fts'
+        # Rank in one pass over the MATCH result joined back to the caller's rows. A correlated
+        # bm25 subquery per row, or "rowid IN (...)" on the FTS table, re-runs MATCH per row.
+        rows_sql, rows_params = queryset.order_by().values('pk').query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                f'SELECT t.id, -f.rank FROM "{table}" t '
+                f'JOIN (SELECT rowid, rank FROM {fts} WHERE {fts} MATCH %s) f ON f.rowid = t.id '
+                f'WHERE t.id IN ({rows_sql}) ORDER BY f.rank, t.date DESC, t.id DESC LIMIT %s',
+                (query, *rows_params, limit),
+            )
+            ranked = cursor.fetchall()
+        rank = Case(*(When(pk=pk, then=Value(score)) for pk, score in ranked), default=None, output_field=FloatField())
+        return queryset, Q(pk__in=[pk for pk, _ in ranked]), rank
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SqliteSearchBackend,
+}
+
+
+def get_search_backend(model):
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    vendor = connections[router.db_for_read(model)].vendor
+    return BACKENDS.get(vendor, SearchBackend)()
+
+
+def search(queryset, fields, text, limit=DEFAULT_LIMIT):
+    return get_search_backend(queryset.model).search(queryset, fields, text, limit)
+
+
+def decode_offset(cursor):
+    if not cursor:
+        return 0
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        return 0
+    # Every page re-ranks offset + limit rows, so a forged cursor past the last page we hand out is a bad one.
+    return offset if 0 <= offset <= MAX_OFFSET else 0
+
+
+def encode_offset(offset):
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+
+def page_payload(rows, columns, offset, limit):
+    return {
+        'columns': list(columns),
+        'rows': rows[:limit],
+        'next': encode_offset(offset + limit) if len(rows) > limit and offset + limit <= MAX_OFFSET else None,
+    }
+
+
+def search_page(queryset, fields, text, columns, limit=DEFAULT_LIMIT, cursor=None, archived=None):
+    """One page of ranked results as {'columns', 'rows', 'next'}, rows being plain value lists.
+
+    Ranked order has no stable keyset, so the opaque cursor wraps an offset; pages are
+    capped by MAX_LIMIT, paging stops at MAX_OFFSET and typeahead clients rarely go past
+    the first one. ``archived`` rows (see expenses.archive) follow the live matches,
+    newest first and with a null id.
+    """
+    offset = decode_offset(cursor)
+    backend = get_search_backend(queryset.model)
+    wanted = offset + limit + 1
+    rows = list(backend.search(queryset, fields, text, wanted).values_list(*columns))
+    if archived is not None and len(rows) < wanted:
+        rows += [[None if column == 'id' else value for column, value in zip(columns, row)]
+                 for row in archived.values_list(*columns)[:wanted - len(rows)]]
+    return page_payload(rows[offset:], columns, offset, limit)
+
+
+async def asearch_page(queryset, fields, text, columns, limit=DEFAULT_LIMIT, cursor=None, archived=None):
+    offset = decode_offset(cursor)
+    backend = get_search_backend(queryset.model)
+    wanted = offset + limit + 1
+    # Building the queryset may already hit the database (SQLite ranks FTS matches up front).
+    results = await sync_to_async(backend.search)(queryset, fields, text, wanted)
+    rows = [[row[column] for column in columns] async for row in results.values(*columns).aiterator()]
+    if archived is not None and len(rows) < wanted:
+        rows += [[None if column == 'id' else row[column] for column in columns]
+                 async for row in archived.values(*columns)[:wanted - len(rows)].aiterator()]
+    return page_payload(rows[offset:], columns, offset, limit)
+
+
+def create_search_index(schema_editor, table, fields):
+    """Build the vendor-specific index the backends above rely on; called from migrations."""
+    vendor = schema_editor.connection.vendor
+    columns = ', '.join(fields)
+    if vendor == 'postgresql':
+        document = " || ' ' || ".join(fields)
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(f'CREATE INDEX {table}_search_trgm ON {table} USING gin (({document}) gin_trgm_ops)')
+    elif vendor == 'sqlite':
+        fts = f'{table}_fts'
+        new_values = ', '.join(f'new.{field}' for field in fields)
+        old_values = ', '.join(f'old.{field}' for field in fields)
+        schema_editor.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='{table}', content_rowid='id', prefix='2 3')")
+        schema_editor.execute(f'CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN '
+                              f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END')
+        schema_editor.execute(f'CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN '
+                              f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END")
+        schema_editor.execute(f'CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN '
+                              f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                              f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END')
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_index(schema_editor, table):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_trgm')
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
@@ -1,3 +1,720 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import gzip
+import io
+import json
+import re
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from authentication.models import OutboxEmail
+from expensetracker.middleware import query_budget
+from expensetracker import checks, sharding
+from expensetracker.routers import PIN_COOKIE
+from userpreferences.fx import get_rates
+from userpreferences.middleware import get_preferences
+from userpreferences.models import UserPreference
+from userincome.models import ArchivedIncome, UserIncome
+from . import rollups
+from .archive import archive_horizon
+from .management.commands import benchmark
+from .cashflow import cash_flow
+from .models import ArchivedExpense, Budget, Category, Expense, TotalExpense
+from .pagination import decode_cursor, encode_cursor, keyset_page
+from .resultcache import counter_key
+from .search import MAX_OFFSET, decode_offset, encode_offset
+from .versioning import version_key
 
-# Create your tests here.
+# "SCAN <table>" without an index is SQLite's full table scan; virtual (FTS) tables are fine.
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+class QueryPlanMixin:
+    """Run the view, EXPLAIN every SELECT it issued and fail on full scans of ``tables``."""
+
+    tables = ()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexed(self, method, path, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = method(path, **kwargs)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            for detail in self.explain(sql):
+                match = FULL_SCAN.match(detail)
+                if match and match.group(1) in self.tables:
+                    self.fail(f'{path} does a full scan of {match.group(1)}:\n{sql}')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are checked against SQLite')
+class ExpenseQueryPlanTests(QueryPlanMixin, TestCase):
+    tables = ('expenses_expense', 'expenses_totalexpense')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='secret123')
+        other = User.objects.create_user('other', password='secret123')
+        today = datetime.date.today()
+        Expense.objects.bulk_create(
+            Expense(owner=owner, amount='9.99', category=f'cat{i % 7}', description=f'groceries {i}', date=today - datetime.timedelta(days=i))
+            for owner in (cls.user, other) for i in range(300)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_list(self):
+        self.assertIndexed(self.client.get, '/')
+
+    def test_list_next_page(self):
+        first = Expense.objects.filter(owner=self.user).order_by('-date', '-id')[4]
+        self.assertIndexed(self.client.get, '/', data={'cursor': encode_cursor('next', first)})
+
+    def test_summary(self):
+        self.assertIndexed(self.client.get, '/expense-category-summary')
+
+    def test_series(self):
+        self.assertIndexed(self.client.get, '/expense-category-series', data={'granularity': 'week'})
+
+    def test_search(self):
+        self.assertIndexed(self.client.post, '/search-expenses', data=json.dumps({'searchText': 'groc'}), content_type='application/json')
+
+    def test_search_date(self):
+        self.assertIndexed(self.client.post, '/search-expenses', data=json.dumps({'searchText': '2024-01'}), content_type='application/json')
+
+    def test_export(self):
+        self.assertIndexed(self.client.get, '/export-csv', data={'category': 'cat3'})
+
+    def test_stats(self):
+        self.assertIndexed(self.client.get, '/stats')
+
+
+class ExpenseQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', password='secret123')
+        today = datetime.date.today()
+        for i in range(20):
+            Expense.objects.create(owner=cls.user, amount='5.00', category=f'cat{i % 4}', description=f'item {i}', date=today)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        # Preferences and the rate table are cached across requests, not read per request.
+        get_preferences(self.user)
+        get_rates()
+
+    def test_summary_is_one_aggregate(self):
+        with query_budget(3, duplicate_threshold=2):
+            self.client.get('/expense-category-summary')
+
+    def test_list_page(self):
+        with query_budget(4, duplicate_threshold=2):
+            self.client.get('/')
+
+    def test_cash_flow_is_one_union(self):
+        with query_budget(3, duplicate_threshold=2):
+            self.client.get('/cash-flow')
+
+    def test_search(self):
+        with query_budget(4, duplicate_threshold=2):
+            response = self.client.post('/search-expenses', data=json.dumps({'searchText': 'item'}), content_type='application/json')
+        self.assertEqual(len(response.json()['rows']), 20)
+
+    @override_settings(SQL_INSTRUMENTATION=True)
+    def test_server_timing_reports_the_queries(self):
+        response = self.client.get('/expense-category-summary')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=\d+\.\d;desc="[1-9]\d* queries"$')
+
+    def test_budget_catches_n_plus_one(self):
+        with self.assertRaises(AssertionError):
+            with query_budget(100, duplicate_threshold=3):
+                for expense in Expense.objects.filter(owner=self.user)[:5]:
+                    Expense.objects.filter(pk=expense.pk).exists()
+
+
+class RollupTests(TestCase):
+
+    def test_concurrent_edit_is_not_counted_twice(self):
+        user = User.objects.create_user('rollup', password='secret123')
+        expense = Expense.objects.create(owner=user, amount='10.00', category='Food', description='lunch')
+        self.client.force_login(user)
+
+        def edit_meanwhile():
+            # Another request saves the row after this one loaded it.
+            other = Expense.objects.get(pk=expense.pk)
+            other.amount = '20.00'
+            other.save()
+            return Category.objects.none()
+
+        with mock.patch.object(Category.objects, 'all', edit_meanwhile):
+            self.client.post(f'/edit-expense/{expense.pk}', {'amount': '30.00', 'description': 'lunch', 'category': 'Food',
+                                                               'expense_date': datetime.date.today().isoformat()})
+        self.assertEqual(TotalExpense.objects.get(owner=user).amount, Decimal('30.00'))
+
+
+class SearchTests(TestCase):
+
+    def test_amounts_the_column_cannot_hold_match_nothing(self):
+        user = User.objects.create_user('searcher', password='secret123')
+        Expense.objects.create(owner=user, amount='5.00', category='Food', description='lunch')
+        self.client.force_login(user)
+        for text in ('Infinity', '-inf', 'NaN', 'sNaN', '1e20', '5.001'):
+            response = self.client.get('/search-expenses', {'searchText': text})
+            self.assertEqual((text, response.status_code, response.json()['rows']), (text, 200, []))
+        self.assertEqual(len(self.client.get('/search-expenses', {'searchText': '5.00'}).json()['rows']), 1)
+
+    def test_offsets_past_the_last_page_are_bad_cursors(self):
+        self.assertEqual(decode_offset(encode_offset(MAX_OFFSET)), MAX_OFFSET)
+        for cursor in (encode_offset(MAX_OFFSET + 1), encode_offset(10**9), encode_offset(-5), 'not-a-cursor'):
+            self.assertEqual(decode_offset(cursor), 0)
+        user = User.objects.create_user('deep', password='secret123')
+        Expense.objects.create(owner=user, amount='5.00', category='Food', description='lunch')
+        self.client.force_login(user)
+        response = self.client.get('/search-expenses', {'searchText': 'lunch', 'cursor': encode_offset(10**9)})
+        self.assertEqual(len(response.json()['rows']), 1)
+
+
+class ImportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('importer', password='secret123')
+        self.client.force_login(self.user)
+
+    def upload(self, content):
+        return self.client.post('/import-expenses', {'statement': SimpleUploadedFile('statement.csv', content), 'category': 'Food'})
+
+    def test_non_finite_amounts_are_row_errors(self):
+        response = self.upload(b'amount,description,date\nNaN,bad,2024-01-02\ninf,worse,2024-01-02\n5.00,lunch,2024-01-02\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([error['row'] for error in response.context['result'].errors], [2, 3])
+        self.assertEqual(list(Expense.objects.values_list('description', flat=True)), ['lunch'])
+
+    def test_undecodable_file_is_rejected(self):
+        response = self.upload('amount,description,date\n5.00,caf\u00e9,2024-01-02\n'.encode('latin-1'))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Expense.objects.exists())
+
+
+@override_settings(RATE_LIMITS={'expense': 2})
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('limited', password='secret123')
+        self.client.force_login(self.user)
+
+    def add_expense(self):
+        return self.client.post('/add-expense', {'amount': '2.50', 'description': 'tea', 'category': 'Food',
+                                                 'expense_date': datetime.date.today().isoformat()})
+
+    def test_writes_over_the_daily_quota_get_429_until_midnight(self):
+        self.assertEqual([self.add_expense().status_code for _ in range(2)], [302, 302])
+        response = self.add_expense()
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 24*60*60)
+        self.assertEqual(Expense.objects.count(), 2)
+
+    def test_deploy_check_requires_a_shared_cache(self):
+        errors = checks.check_shared_caches(None)
+        self.assertEqual([(error.id, error.obj) for error in errors],
+                         [('expensetracker.E001', setting) for setting in checks.SHARED_CACHE_SETTINGS])
+        with mock.patch('expensetracker.checks.is_shared', return_value=True):
+            self.assertEqual(checks.check_shared_caches(None), [])
+
+
+class ManagementCommandTests(TestCase):
+
+    def test_seed_data_rollups_match_the_rows(self):
+        call_command('seed_data', '--users', '2', '--expenses', '30', '--income', '5', '--seed', '1', stdout=io.StringIO())
+        owners = User.objects.filter(username__startswith='seed')
+        self.assertEqual(owners.count(), 2)
+        for owner in owners:
+            self.assertEqual(Expense.objects.filter(owner=owner).count(), 30)
+            self.assertEqual(UserIncome.objects.filter(owner=owner).count(), 5)
+            expected = {}
+            for expense in Expense.objects.filter(owner=owner):
+                expected[expense.category] = expected.get(expense.category, 0) + expense.amount
+            self.assertEqual(dict(TotalExpense.objects.filter(owner=owner).values_list('category', 'amount')), expected)
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_benchmark_reports_every_endpoint(self):
+        call_command('seed_data', '--users', '1', '--expenses', '10', '--income', '2', '--seed', '1', stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('benchmark', '--user', 'seed0', '--requests', '2', '--warmup', '0', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['endpoints']), set(benchmark.ENDPOINTS))
+        for name, result in report['endpoints'].items():
+            self.assertEqual((name, result['requests']), (name, 2))
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('async', password='secret123')
+        Expense.objects.create(owner=self.user, amount='10.00', category='Food', description='old lunch', date=datetime.date(2020, 3, 10))
+        call_command('archive_ledger', '--older-than', '2021-01-01', stdout=io.StringIO())
+        Expense.objects.create(owner=self.user, amount='5.00', category='Food', description='lunch')
+        Expense.objects.create(owner=self.user, amount='2.50', category='Rent', description='rent')
+        self.client.force_login(self.user)
+
+    def test_summary_matches_the_sync_view(self):
+        for query in ('', '?from=2020-01-01', '?from=2020-01-01&to=2020-12-31', '?from=bad'):
+            sync = self.client.get('/expense-category-summary' + query)
+            response = self.client.get('/async/expense-category-summary' + query)
+            self.assertEqual((response.status_code, response.json()), (sync.status_code, sync.json()))
+
+    def test_search_matches_the_sync_view(self):
+        for text in ('lunch', '2020-03', '5.00', 'nothing'):
+            body = json.dumps({'searchText': text, 'limit': 1})
+            sync = self.client.post('/search-expenses', body, content_type='application/json').json()
+            self.assertEqual(self.client.post('/async/search-expenses', body, content_type='application/json').json(), sync)
+            query = {'searchText': text, 'limit': 1}
+            self.assertEqual(self.client.get('/async/search-expenses', query).json(), self.client.get('/search-expenses', query).json())
+
+    def test_search_answers_304_until_the_data_changes(self):
+        query = {'searchText': 'lunch'}
+        etag = self.client.get('/async/search-expenses', query)['ETag']
+        self.assertEqual(self.client.get('/async/search-expenses', query, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(owner=self.user, amount='1.00', category='Food', description='late lunch')
+        response = self.client.get('/async/search-expenses', query, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, len(response.json()['rows'])), (200, 2))
+
+    def test_conditional_get_and_result_cache(self):
+        self.client.get('/expense-category-summary')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/async/expense-category-summary')
+        self.assertFalse([query for query in queries if 'expenses_expense' in query['sql']])
+        self.assertEqual(self.client.get('/async/expense-category-summary', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_anonymous_users_are_redirected_like_the_sync_views(self):
+        self.client.logout()
+        for path in ('/expense-category-summary', '/search-expenses'):
+            sync = self.client.post(path)
+            response = self.client.post(path.replace('/', '/async/', 1))
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(response['Location'], sync['Location'].replace(path, path.replace('/', '/async/', 1)))
+
+
+class PaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('pager', password='secret123')
+        # Three rows a day, so pages split inside a date and the id breaks the tie.
+        for day in range(1, 5):
+            for n in range(3):
+                Expense.objects.create(owner=self.user, amount='1.00', category='Food', description=f'{day}-{n}',
+                                       date=datetime.date(2023, 1, day))
+        self.expenses = Expense.objects.filter(owner=self.user)
+        self.ordered = list(self.expenses.order_by('-date', '-id').values_list('pk', flat=True))
+
+    def ids(self, page):
+        return [obj.pk for obj in page]
+
+    def test_forward_and_back_through_equal_dates(self):
+        pages = [keyset_page(self.expenses, None, 5)]
+        while pages[-1].has_next:
+            pages.append(keyset_page(self.expenses, pages[-1].next_cursor, 5))
+        self.assertEqual([self.ids(page) for page in pages], [self.ordered[:5], self.ordered[5:10], self.ordered[10:]])
+        self.assertIsNone(pages[0].previous_cursor)
+        self.assertIsNone(pages[-1].next_cursor)
+
+        back = keyset_page(self.expenses, pages[-1].previous_cursor, 5)
+        self.assertEqual(self.ids(back), self.ordered[5:10])
+        self.assertTrue(back.has_previous and back.has_next)
+        first = keyset_page(self.expenses, back.previous_cursor, 5)
+        self.assertEqual(self.ids(first), self.ordered[:5])
+        self.assertIsNone(first.previous_cursor)
+        self.assertEqual(self.ids(keyset_page(self.expenses, first.next_cursor, 5)), self.ordered[5:10])
+
+    def test_last_page_of_an_exact_multiple(self):
+        first = keyset_page(self.expenses, None, 6)
+        last = keyset_page(self.expenses, first.next_cursor, 6)
+        self.assertEqual(self.ids(last), self.ordered[6:])
+        self.assertFalse(last.has_next)
+        self.assertFalse(keyset_page(self.expenses, None, 25).has_next)
+
+    def test_tampered_cursors_are_rejected(self):
+        encode = lambda raw: base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+        for cursor in ('', '!!!', encode('nope'), encode('up:2023-01-01:1'), encode('next:2023-13-01:1'),
+                       encode('next:2023-01-01:x'), encode('next:2023-01-01:1:2')):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+        self.assertEqual(decode_cursor(encode_cursor('prev', self.expenses.get(description='2-1'))),
+                         ('prev', datetime.date(2023, 1, 2), self.expenses.get(description='2-1').pk))
+
+        # The list view starts over from the first page.
+        self.client.force_login(self.user)
+        response = self.client.get('/', {'cursor': encode('next:bad:1'), 'per_page': 5})
+        self.assertEqual(self.ids(response.context['page_obj']), self.ordered[:5])
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('exporter', password='secret123')
+        for amount, category, day in (('5.00', 'Food', 5), ('7.00', 'Rent', 40), ('2.00', 'Food', 60)):
+            Expense.objects.create(owner=self.user, amount=amount, category=category, description=f'item {day}',
+                                   date=datetime.date(2023, 1, 1) + datetime.timedelta(days=day))
+        self.client.force_login(self.user)
+
+    def rows(self, response, compressed=False):
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content)
+        return list(csv.reader(io.StringIO((gzip.decompress(body) if compressed else body).decode())))
+
+    def test_filters_select_the_streamed_rows(self):
+        rows = self.rows(self.client.get('/export-csv', {'from': '2023-02-01', 'to': '2023-03-31', 'category': 'Food'}))
+        self.assertEqual(rows[0], ['Amount', 'Currency', 'Amount (INR)', 'Description', 'Category', 'Date'])
+        self.assertEqual([(row[0], row[3], row[5]) for row in rows[1:]], [('2.00', 'item 60', '2023-03-02')])
+        self.assertEqual(len(self.rows(self.client.get('/export-csv', {'to': '2023-02-28'}))), 3)
+        self.assertEqual(self.client.get('/export-csv', {'from': 'bad'}).status_code, 400)
+
+    def test_gzip_is_negotiated(self):
+        plain = self.client.get('/export-csv')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        encoded = self.client.get('/export-csv', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual((encoded['Content-Encoding'], encoded['Content-Type']), ('gzip', 'text/csv'))
+        self.assertEqual(self.rows(encoded, compressed=True), self.rows(plain))
+
+        download = self.client.get('/export-csv?gzip=1')
+        self.assertEqual(download['Content-Type'], 'application/gzip')
+        self.assertFalse(download.has_header('Content-Encoding'))
+        self.assertIn('.csv.gz', download['Content-Disposition'])
+        self.assertEqual(len(self.rows(download, compressed=True)), 4)
+
+    def test_anonymous_users_are_redirected(self):
+        self.client.logout()
+        for path in ('/export-csv', '/income/export-csv'):
+            self.assertRedirects(self.client.get(path), f'/authentication/login?next={path}', fetch_redirect_response=False)
+
+
+class SeriesTests(TestCase):
+
+    def test_anonymous_users_are_redirected(self):
+        for path in ('/expense-category-series', '/income/income-source-series'):
+            self.assertRedirects(self.client.get(path), f'/authentication/login?next={path}', fetch_redirect_response=False)
+
+
+class CashFlowTests(TestCase):
+
+    def test_monthly_totals_and_running_balance(self):
+        user = User.objects.create_user('flow', password='secret123')
+        Expense.objects.create(owner=user, amount='10.00', category='Food', description='old', date=datetime.date(2022, 12, 20))
+        UserIncome.objects.create(owner=user, amount='100.00', source='Salary', description='old', date=datetime.date(2022, 12, 1))
+        UserIncome.objects.create(owner=user, amount='50.00', source='Salary', description='pay', date=datetime.date(2023, 1, 31))
+        Expense.objects.create(owner=user, amount='12.50', category='Food', description='food', date=datetime.date(2023, 3, 2))
+        Expense.objects.create(owner=user, amount='2.50', category='Rent', description='rent', date=datetime.date(2023, 3, 9))
+
+        flow = cash_flow(user.pk, datetime.date(2023, 1, 1), datetime.date(2023, 3, 31))
+        self.assertEqual(flow['labels'], ['2023-01-01', '2023-02-01', '2023-03-01'])
+        self.assertEqual(flow['income'], [Decimal('50.00'), 0, 0])
+        self.assertEqual(flow['expense'], [0, 0, Decimal('15.00')])
+        self.assertEqual(flow['net'], [Decimal('50.00'), 0, Decimal('-15.00')])
+        self.assertEqual(flow['opening_balance'], Decimal('90.00'))
+        self.assertEqual(flow['balance'], [Decimal('140.00'), Decimal('140.00'), Decimal('125.00')])
+
+    def test_anonymous_users_are_redirected(self):
+        self.assertRedirects(self.client.get('/cash-flow'), '/authentication/login?next=/cash-flow', fetch_redirect_response=False)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('etag', password='secret123')
+        self.client.force_login(self.user)
+
+    def test_unchanged_data_answers_304_without_aggregating(self):
+        for path in ('/expense-category-summary', '/stats', '/export-csv', '/search-expenses?searchText=x'):
+            etag = self.client.get(path)['ETag']
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertFalse([query for query in queries if 'expenses_' in query['sql']])
+
+    def test_write_changes_the_etag(self):
+        etag = self.client.get('/expense-category-summary')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(owner=self.user, amount='5.00', category='Food', description='lunch')
+        response = self.client.get('/expense-category-summary', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(DATA_VERSION_CACHE='versions', CACHES={
+        **settings.CACHES, 'versions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'versions'}})
+    def test_stamps_live_in_the_data_version_cache(self):
+        etag = self.client.get('/expense-category-summary')['ETag']
+        # A write in another process reaches this one only through that cache.
+        caches['versions'].incr(version_key(self.user.pk))
+        self.assertEqual(self.client.get('/expense-category-summary', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_date_windowed_views_change_etag_with_the_day(self):
+        for path in ('/expense-category-summary', '/expense-category-series', '/cash-flow', '/stats',
+                     '/async/expense-category-summary'):
+            response = self.client.get(path)
+            self.assertFalse(response.has_header('Last-Modified'))
+            with mock.patch('expenses.versioning.datetime') as clock:
+                clock.date.today.return_value = datetime.date.today() + datetime.timedelta(days=1)
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 200)
+
+
+class ResultCacheTests(TestCase):
+
+    def setUp(self):
+        caches['results'].clear()
+        self.user = User.objects.create_user('results', password='secret123', is_staff=True)
+        Expense.objects.create(owner=self.user, amount='5.00', category='Food', description='lunch')
+        self.client.force_login(self.user)
+
+    def get_summary(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/expense-category-summary').json()['expense_category_data']
+        return data, len([query for query in queries if 'expenses_expense' in query['sql']])
+
+    def test_repeat_is_served_from_cache_until_a_write(self):
+        self.assertEqual(self.get_summary(), ({'Food': '5.00'}, 1))
+        self.assertEqual(self.get_summary(), ({'Food': '5.00'}, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(owner=self.user, amount='2.50', category='Food', description='tea')
+        self.assertEqual(self.get_summary(), ({'Food': '7.50'}, 1))
+
+        stats = self.client.get('/result-cache-stats').json()['result_cache']['expense_category_summary']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_stats_include_the_counts_of_other_processes(self):
+        self.get_summary()
+        # Hits other processes counted in the same cache.
+        caches['results'].set(counter_key('expense_category_summary', 'hits'), 3)
+        stats = self.client.get('/result-cache-stats').json()['result_cache']['expense_category_summary']
+        self.assertEqual((stats['hits'], stats['misses']), (3, 1))
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs a second database alias named replica, e.g. expensetracker.sqlite_settings')
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRouterTests(TestCase):
+    # The two test databases are independent, so rows written to default never show up on the replica.
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('replica', password='secret123')
+        Expense.objects.create(owner=self.user, amount='5.00', category='Food', description='lunch')
+        self.client.force_login(self.user)
+
+    def summary(self):
+        return self.client.get('/expense-category-summary').json()['expense_category_data']
+
+    def test_reporting_views_read_from_the_replica(self):
+        self.assertEqual(self.summary(), {})
+        self.assertEqual(self.client.get('/search-expenses?searchText=lunch').json()['rows'], [])
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self.client.post('/add-expense', {'amount': '2.50', 'description': 'tea', 'category': 'Food',
+                                          'expense_date': datetime.date.today().isoformat()})
+        self.assertEqual(self.summary(), {'Food': '7.50'})
+        self.assertEqual(self.client.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_STICKY_SECONDS)
+
+        cache.delete(version_key(self.user.pk))
+        self.client.cookies[PIN_COOKIE] = str(self.user.pk)
+        self.assertEqual(self.summary(), {}, 'an unsigned pin is ignored')
+        del self.client.cookies[PIN_COOKIE]
+        self.assertEqual(self.summary(), {})
+
+
+@skipUnless('shard1' in settings.DATABASES, 'needs a second database alias named shard1, e.g. expensetracker.sqlite_settings')
+@override_settings(SHARDS=['default', 'shard1'])
+class ShardRouterTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('sharded', password='secret123')
+        self.home = sharding.shard_for(self.user.pk)
+        self.other = 'shard1' if self.home == 'default' else 'default'
+        UserPreference.objects.db_manager(self.home).get_or_create(user=self.user, defaults={'currency': 'INR'})
+        self.client.force_login(self.user)
+
+    def add_expense(self, amount, description):
+        self.client.post('/add-expense', {'amount': amount, 'description': description, 'category': 'Food',
+                                          'expense_date': datetime.date.today().isoformat()})
+
+    def rows(self, alias, model=Expense):
+        return list(model.objects.using(alias).filter(owner=self.user).values_list('description', 'amount'))
+
+    def test_rows_live_on_the_owners_shard(self):
+        self.assertEqual(self.home, sharding.hashed_shard(self.user.pk))
+        self.add_expense('5.00', 'lunch')
+        self.assertEqual(self.rows(self.home), [('lunch', Decimal('5.00'))])
+        self.assertEqual(self.rows(self.other), [])
+        self.assertEqual(self.client.get('/expense-category-summary').json()['expense_category_data'], {'Food': '5.00'})
+
+    def test_rebalance_moves_rows_and_rollups(self):
+        self.add_expense('5.00', 'lunch')
+        self.add_expense('2.50', 'tea')
+        call_command('rebalance_shards', 'sharded', '--to', self.other, '--batch-size', '1', stdout=io.StringIO())
+
+        self.assertEqual(sharding.shard_for(self.user.pk), self.other)
+        self.assertEqual(self.rows(self.home), [])
+        self.assertEqual(sorted(self.rows(self.other)), [('lunch', Decimal('5.00')), ('tea', Decimal('2.50'))])
+        self.assertEqual(TotalExpense.objects.using(self.other).get(owner=self.user).amount, Decimal('7.50'))
+        self.assertTrue(UserPreference.objects.using(self.other).filter(user=self.user).exists())
+
+        self.add_expense('1.00', 'water')
+        cache.delete(version_key(self.user.pk))
+        self.assertEqual(self.client.get('/expense-category-summary').json()['expense_category_data'], {'Food': '8.50'})
+
+    def test_writes_during_the_copy_are_moved_too(self):
+        self.add_expense('5.00', 'lunch')
+        copy_rows = sharding.copy_rows
+        writes = [('2.50', 'tea')]
+
+        def copy_then_write(*args):
+            copied = copy_rows(*args)
+            if writes:
+                # Committed after the copy read the source, only the generation check notices it.
+                self.add_expense(*writes.pop())
+            return copied
+
+        with mock.patch('expensetracker.sharding.copy_rows', side_effect=copy_then_write) as copy:
+            self.assertIsNotNone(sharding.move_user(self.user.pk, self.other))
+        self.assertEqual(copy.call_count, 2)
+
+        self.assertEqual(sharding.shard_for(self.user.pk), self.other)
+        self.assertEqual(self.rows(self.home), [])
+        self.assertEqual(sorted(self.rows(self.other)), [('lunch', Decimal('5.00')), ('tea', Decimal('2.50'))])
+        self.assertEqual(TotalExpense.objects.using(self.other).get(owner=self.user).amount, Decimal('7.50'))
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('archivist', password='secret123')
+        Expense.objects.create(owner=self.user, amount='10.00', category='Food', description='old lunch', date=datetime.date(2020, 3, 10))
+        Expense.objects.create(owner=self.user, amount='5.00', category='Food', description='lunch')
+        UserIncome.objects.create(owner=self.user, amount='20.00', source='Salary', description='old pay', date=datetime.date(2020, 3, 1))
+        call_command('archive_ledger', '--older-than', '2021-01-01', stdout=io.StringIO())
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_rows_move_and_rollups_stay(self):
+        self.assertEqual(list(Expense.objects.values_list('description', flat=True)), ['lunch'])
+        self.assertEqual(list(ArchivedExpense.objects.values_list('description', flat=True)), ['old lunch'])
+        self.assertEqual(TotalExpense.objects.get(owner=self.user).amount, Decimal('15.00'))
+
+    def test_old_windows_read_the_archive(self):
+        summary = lambda query: self.client.get('/expense-category-summary' + query).json()['expense_category_data']
+        self.assertEqual(summary(''), {'Food': '5.00'})
+        self.assertEqual(summary('?from=2020-01-01'), {'Food': '15.00'})
+        self.assertEqual(cash_flow(self.user.pk, datetime.date(2021, 1, 1), datetime.date.today())['opening_balance'], Decimal('10.00'))
+
+        rows = self.client.get('/search-expenses?searchText=2020-03').json()['rows']
+        self.assertEqual([(row[0], row[4]) for row in rows], [(None, 'old lunch')])
+
+        export = b''.join(self.client.get('/export-csv?from=2020-01-01').streaming_content).decode()
+        self.assertIn('old lunch', export)
+        self.assertNotIn('old lunch', b''.join(self.client.get('/export-csv').streaming_content).decode())
+
+    def test_rows_archived_elsewhere_are_read_without_invalidation(self):
+        self.assertEqual(archive_horizon(UserIncome, self.user.pk), datetime.date(2020, 3, 2))
+        # As archive_ledger would from its own process, with no way to reach this one's cache.
+        ArchivedIncome.objects.create(owner=self.user, amount='1.00', source='Salary', description='x', date=datetime.date(2020, 6, 1))
+        self.assertEqual(archive_horizon(UserIncome, self.user.pk), datetime.date(2020, 6, 2))
+
+    def test_rebuild_keeps_counting_archived_rows(self):
+        rollups.rebuild(TotalExpense, Expense, 'category', self.user)
+        self.assertEqual(TotalExpense.objects.get(owner=self.user).amount, Decimal('15.00'))
+
+
+@override_settings(EMAIL_OUTBOX_WORKERS=0)
+class BudgetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('budgeter', email='budgeter@example.com', password='secret123')
+        self.client.force_login(self.user)
+        Expense.objects.create(owner=self.user, amount='3.00', category='Food', description='before the budget')
+        self.client.post('/budgets', {'category': 'Food', 'amount': '10'})
+
+    def add_expense(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/add-expense', {'amount': amount, 'description': 'snack', 'category': 'Food',
+                                                         'expense_date': datetime.date.today().isoformat()}, follow=True)
+        return [str(message) for message in response.context['messages'] if message.level_tag == 'warning']
+
+    def status(self):
+        cache.delete(version_key(self.user.pk))
+        return self.client.get('/budget-status').json()['budget_status'][0]
+
+    def test_thresholds_alert_once(self):
+        self.assertEqual((self.status()['spent'], self.status()['alerted']), ('3.00', 0))
+        self.assertEqual(self.add_expense('4.00'), [])
+        self.assertIn('reached 80%', self.add_expense('1.50')[0])
+        self.assertEqual(self.add_expense('0.50'), [])
+        self.assertIn('reached 100%', self.add_expense('2.00')[0])
+        self.assertEqual(OutboxEmail.objects.filter(to=['budgeter@example.com']).count(), 2)
+
+        Expense.objects.filter(description='snack', amount='2.00').get().delete()
+        self.assertEqual((self.status()['spent'], self.status()['alerted']), ('9.00', 80))
+        self.assertIn('reached 100%', self.add_expense('1.00')[0])
+
+    def test_status_reads_only_counters(self):
+        self.add_expense('4.00')
+        with CaptureQueriesContext(connection) as queries:
+            status = self.status()
+        self.assertEqual((status['limit'], status['spent'], status['remaining']), ('10.00', '7.00', '3.00'))
+        self.assertFalse([query for query in queries.captured_queries if 'expenses_expense' in query['sql']])
+
+    def test_edits_move_the_counter_by_the_difference(self):
+        self.add_expense('4.00')
+        expense = Expense.objects.get(description='snack')
+        expense.amount = '6.00'
+        expense.save()
+        self.assertEqual(self.status()['spent'], '9.00')
+
+    def test_budgets_set_by_another_process_are_counted(self):
+        self.add_expense('1.00')
+        # Saved elsewhere: none of this process' receivers run.
+        Budget.objects.bulk_create([Budget(owner=self.user, category='Rent', amount='10')])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/add-expense', {'amount': '9.00', 'description': 'rent', 'category': 'Rent',
+                                                         'expense_date': datetime.date.today().isoformat()}, follow=True)
+        self.assertIn('Rent spending', [str(message) for message in response.context['messages']][-1])
+
+    def test_non_finite_amounts_are_rejected(self):
+        for amount in ('NaN', 'Infinity', '-inf'):
+            self.assertEqual(self.client.post('/budgets', {'category': 'Food', 'amount': amount}).status_code, 400)
+
+    def test_status_needs_login(self):
+        self.client.logout()
+        self.assertRedirects(self.client.get('/budget-status'), '/authentication/login?next=/budget-status',
+                             fetch_redirect_response=False)
+
+    def test_status_is_not_revalidated_into_the_next_month(self):
+        etag = self.client.get('/budget-status')['ETag']
+        with mock.patch('expenses.versioning.datetime') as clock:
+            clock.date.today.return_value = datetime.date.today() + datetime.timedelta(days=31)
+            self.assertEqual(self.client.get('/budget-status', HTTP_IF_NONE_MATCH=etag).status_code, 200)
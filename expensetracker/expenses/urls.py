@@ -1,16 +1,25 @@
 from django.contrib import admin
 from django.urls import path
-from . import views
+from . import views, async_views
 from django.views.decorators.csrf import csrf_exempt
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.index, name='expenses'),
     path('add-expense', views.add_expense, name='add-expense'),
+    path('import-expenses', views.import_expenses, name='import-expenses'),
     path('edit-expense/<int:id>', views.edit_expense, name='edit-expense'),
     path('delete-expense/<int:id>', views.delete_expense, name='delete-expense'),
     path('search-expenses', csrf_exempt(views.search_expenses), name='search-expenses'),
     path('expense-category-summary', views.expense_category_summary, name='expense-category-summary'),
+    path('async/search-expenses', async_views.search_expenses, name='search-expenses-async'),
+    path('async/expense-category-summary', async_views.expense_category_summary, name='expense-category-summary-async'),
+    path('expense-category-series', views.expense_category_series, name='expense-category-series'),
+    path('cash-flow', views.cash_flow_data, name='cash-flow'),
+    path('dashboard', views.dashboard, name='dashboard'),
     path('stats', views.stats_view, name='expense-stats'),
+    path('result-cache-stats', views.result_cache_stats, name='result-cache-stats'),
     path('export-csv', views.export_csv, name='expense-export-csv'),
+    path('budgets', views.set_budget, name='set-budget'),
+    path('budget-status', views.budget_status, name='budget-status'),
 ]
\ No newline at end of file
@@ -0,0 +1,219 @@
+import csv
+import datetime
+import re
+import zlib
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from userpreferences.fx import converted_amount
+
+DEFAULT_WINDOW_DAYS = 30*6
+CENTS = Decimal('0.01')
+MAX_AMOUNT = Decimal('99999999.99')
+EXPORT_CHUNK_SIZE = 2000
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def parse_date(value):
+    return datetime.date.fromisoformat(value)
+
+
+def get_date_window(request, default_days=DEFAULT_WINDOW_DAYS):
+    """Read ?from=&to= (YYYY-MM-DD), defaulting to the last ``default_days`` days."""
+    to_param = request.GET.get('to')
+    from_param = request.GET.get('from')
+    date_to = parse_date(to_param) if to_param else datetime.date.today()
+    date_from = parse_date(from_param) if from_param else date_to - datetime.timedelta(days=default_days)
+    if date_from > date_to:
+        raise ValueError('from must not be after to')
+    return date_from, date_to
+
+
+def export_start(request):
+    """The explicit ?from= of an export, or None; raises ValueError on a bad date."""
+    return parse_date(request.GET['from']) if request.GET.get('from') else None
+
+
+def filter_export(request, queryset, field):
+    """Apply the optional ?from=&to=&<field>= export filters; raises ValueError on bad dates."""
+    if request.GET.get('from'):
+        queryset = queryset.filter(date__gte=parse_date(request.GET['from']))
+    if request.GET.get('to'):
+        queryset = queryset.filter(date__lte=parse_date(request.GET['to']))
+    if request.GET.get(field):
+        queryset = queryset.filter(**{field: request.GET[field]})
+    return queryset
+
+
+class Echo:
+    # csv.writer only needs write(); hand each formatted line straight back.
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_gzip(chunks, flush_every=64):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    pending = []
+    for chunk in chunks:
+        pending.append(chunk.encode())
+        if len(pending) >= flush_every:
+            data = compressor.compress(b''.join(pending))
+            pending = []
+            if data:
+                yield data
+    yield compressor.compress(b''.join(pending)) + compressor.flush()
+
+
+def csv_response(request, name, header, rows):
+    """Stream ``rows`` as a CSV download.
+
+    ?gzip=1 downloads a .csv.gz file; otherwise the CSV is sent with Content-Encoding: gzip to
+    clients that accept it, so browsers still save a plain .csv.
+    """
+    content = iter_csv(header, rows)
+    filename = name+str(datetime.datetime.now())+'.csv'
+    if request.GET.get('gzip'):
+        response = StreamingHttpResponse(iter_gzip(content), content_type='application/gzip')
+        filename += '.gz'
+    elif ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        response = StreamingHttpResponse(iter_gzip(content), content_type='text/csv')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(content, content_type='text/csv')
+    patch_vary_headers(response, ['Accept-Encoding'])
+    response['Content-Disposition'] = 'attachment; filename='+filename
+    return response
+
+
+def amount_total(currency=None):
+    # Rows in a currency without a known rate convert to NULL and drop out of the sum.
+    return Sum(converted_amount(currency) if currency else 'amount')
+
+
+def summary_rows(queryset, field, total):
+    # Grouped by currency too, so a currency without a rate still reports its original total.
+    return queryset.order_by().values(field, 'currency').annotate(total=total, original=Sum('amount'))
+
+
+def add_total(totals, unconverted, key, row):
+    """Add a grouped row's converted total under ``key``, or its original amount to ``unconverted``."""
+    if row['total'] is None:
+        if unconverted is not None:
+            unconverted[row['currency']] = unconverted.get(row['currency'], Decimal('0.00')) + Decimal(row['original']).quantize(CENTS)
+        return
+    totals[key] = totals.get(key, Decimal('0.00')) + row['total']
+
+
+def summarize_by(queryset, field, currency=None, unconverted=None):
+    """Total ``amount`` per distinct ``field`` value in a single GROUP BY query, in ``currency`` if given.
+
+    Amounts in a currency with no rate to ``currency`` are left out; pass a dict as ``unconverted``
+    to collect them there per currency, so callers can show what is missing.
+    """
+    totals = {}
+    for row in summary_rows(queryset, field, amount_total(currency)):
+        add_total(totals, unconverted, row[field], row)
+    # SQLite hands aggregates back through float, so pin them to cents again.
+    return {key: total.quantize(CENTS) for key, total in totals.items()}
+
+
+def summarize_ledger(querysets, field, currency=None, unconverted=None):
+    """summarize_by over the live and archived parts of a window (see expenses.archive), added up."""
+    totals = {}
+    for queryset in querysets:
+        for key, total in summarize_by(queryset, field, currency, unconverted).items():
+            totals[key] = totals.get(key, Decimal('0.00')) + total
+    return totals
+
+
+async def asummarize_by(queryset, field, currency=None, unconverted=None):
+    # amount_total() may load the rate table, so build it off the event loop.
+    total = await sync_to_async(amount_total)(currency)
+    totals = {}
+    # values() rather than values_list(): the latter cannot be aiterator()'d before Django 5.0.
+    async for row in summary_rows(queryset, field, total).aiterator():
+        add_total(totals, unconverted, row[field], row)
+    return {key: total.quantize(CENTS) for key, total in totals.items()}
+
+
+async def asummarize_ledger(querysets, field, currency=None, unconverted=None):
+    totals = {}
+    for queryset in querysets:
+        for key, total in (await asummarize_by(queryset, field, currency, unconverted)).items():
+            totals[key] = totals.get(key, Decimal('0.00')) + total
+    return totals
+
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + datetime.timedelta(days=7)
+    if granularity == 'month':
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return day + datetime.timedelta(days=1)
+
+
+def bucket_labels(date_from, date_to, granularity):
+    labels = []
+    day = bucket_start(date_from, granularity)
+    while day <= date_to:
+        labels.append(day)
+        day = next_bucket(day, granularity)
+    return labels
+
+
+def bucket_series(querysets, field, granularity, date_from, date_to, currency=None):
+    """Columnar per-bucket totals: one label array plus one value array per ``field`` value.
+
+    Buckets are computed in the database with Trunc*, per queryset (live and archived rows);
+    empty buckets are filled with zero so every series lines up with ``labels``.
+    """
+    trunc = GRANULARITIES[granularity]
+    labels = bucket_labels(date_from, date_to, granularity)
+    positions = {label: index for index, label in enumerate(labels)}
+
+    series = {}
+    unconverted = {}
+    for queryset in querysets:
+        rows = (queryset.order_by()
+                .annotate(bucket=trunc('date'))
+                .values('bucket', field, 'currency')
+                .annotate(total=amount_total(currency), original=Sum('amount')))
+        for row in rows:
+            bucket = row['bucket']
+            if hasattr(bucket, 'date'):
+                bucket = bucket.date()
+            totals = {}
+            add_total(totals, unconverted, bucket, row)
+            if totals:
+                values = series.setdefault(row[field], [Decimal('0.00')] * len(labels))
+                values[positions[bucket]] += totals[bucket].quantize(CENTS)
+
+    return {
+        'granularity': granularity,
+        'labels': [label.isoformat() for label in labels],
+        'series': series,
+        'unconverted': unconverted,
+    }
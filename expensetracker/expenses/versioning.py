@@ -0,0 +1,109 @@
+import datetime
+import functools
+import hashlib
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+from userpreferences.fx import rates_version
+
+
+def version_cache():
+    return caches[getattr(settings, 'DATA_VERSION_CACHE', 'default')]
+
+
+def version_key(user_id):
+    return f'dataversion:{user_id}'
+
+
+def get_version(user_id):
+    """The user's data-version stamp (ns since the epoch of their last Expense/UserIncome write)."""
+    cache = version_cache()
+    key = version_key(user_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        # Never written or evicted: start a fresh stamp so no old ETag can match.
+        cache.add(key, time.time_ns(), None)
+        stamp = cache.get(key)
+    return stamp
+
+
+def bump_version(user_id, using=None):
+    # Bump after commit, otherwise a concurrent read could pair old rows with the new stamp.
+    transaction.on_commit(lambda: version_cache().set(version_key(user_id), time.time_ns(), None), using=using)
+
+
+def request_version(request):
+    if request.method not in ('GET', 'HEAD') or not request.user.is_authenticated:
+        return None
+    if not hasattr(request, '_data_version'):
+        request._data_version = get_version(request.user.pk)
+    return request._data_version
+
+
+def data_etag(request, *args, **kwargs):
+    stamp = request_version(request)
+    if stamp is None:
+        return None
+    # Converted amounts also depend on the preferred currency and the rate table, and
+    # rendered pages embed the CSRF token. get_token() fixes the secret before the view runs.
+    get_token(request)
+    parts = (stamp, request.preferences.currency, rates_version(), request.META.get('CSRF_COOKIE'))
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def data_last_modified(request, *args, **kwargs):
+    stamp = request_version(request)
+    if stamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(stamp / 1e9, tz=datetime.timezone.utc)
+
+
+def dated_etag(request, *args, **kwargs):
+    etag = data_etag(request)
+    if etag is None:
+        return None
+    # Default windows end today, so the same data answers differently tomorrow.
+    return hashlib.md5(f'{etag}:{datetime.date.today()}'.encode()).hexdigest()
+
+
+# For views whose output depends only on the user's own expenses and income.
+conditional_on_data = condition(etag_func=data_etag, last_modified_func=data_last_modified)
+# For views reading a date window that moves with the day. No Last-Modified: the data's own
+# timestamp stays put when only the date changes.
+conditional_on_date = condition(etag_func=dated_etag)
+
+
+def acondition(etag_func=None, last_modified_func=None):
+    """condition() for coroutine views, which it only wraps from Django 5.0 on."""
+
+    def validators(request, *args, **kwargs):
+        etag = etag_func(request, *args, **kwargs) if etag_func else None
+        last_modified = last_modified_func(request, *args, **kwargs) if last_modified_func else None
+        return quote_etag(etag) if etag is not None else None, int(last_modified.timestamp()) if last_modified else None
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def inner(request, *args, **kwargs):
+            # The validators read the session, the cache and the preferences with sync calls.
+            etag, last_modified = await sync_to_async(validators)(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+aconditional_on_data = acondition(etag_func=data_etag, last_modified_func=data_last_modified)
+aconditional_on_date = acondition(etag_func=dated_etag)
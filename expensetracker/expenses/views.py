@@ -1,58 +1,87 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
-from .models import Category, Expense, TotalExpense
+from django.contrib.auth.decorators import login_required, user_passes_test
+from .models import Budget, Category, Expense, TotalExpense
 from django.core.paginator import Paginator
+import itertools
 import json
-from django.http import JsonResponse, HttpResponse
-from userpreferences.models import UserPreference
-import datetime
-import csv
-from django.db.models.signals import post_save, pre_save
+from decimal import Decimal, InvalidOperation
+from django.http import JsonResponse, HttpResponse, HttpResponseNotAllowed
+from django.db.models.signals import post_save, pre_save, post_delete
+from django.db import router
+from django.db.models import DecimalField
+from django.db.models.functions import Cast
+from . import budgets, rollups
 from django.dispatch import receiver
+from . import importers
+from .cashflow import cash_flow
+from .ratelimit import consume, limited_response
+from .search import date_range, search_page, get_limit
+from .pagination import keyset_page, get_page_size, PAGE_SIZES
+from .utils import get_date_window, summarize_by, summarize_ledger, bucket_series, filter_export, export_start, csv_response, GRANULARITIES, EXPORT_CHUNK_SIZE, CENTS, MAX_AMOUNT
+from .archive import archived_window, ledger
+from userpreferences.currencies import currency_code
+from userpreferences.fx import converted_amount
+from userpreferences.middleware import stored_currency
+from .versioning import bump_version, conditional_on_data, conditional_on_date
+from expensetracker import sharding
+from expensetracker.routers import read_replica
+from .resultcache import cached_result, cache_stats
 # Create your views here.
 
+@receiver(pre_save, sender=Expense)
+def snapshot_expense(sender, instance, **kwargs):
+    rollups.before_save(instance, 'category')
+
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def reset_budget_counters(sender, instance, using, **kwargs):
+    budgets.budget_changed(instance, deleted=kwargs['signal'] is post_delete)
+    bump_version(instance.owner_id, using)
+
 @receiver(post_save, sender=Expense)
-def update_total_expense(sender, instance, **kwargs):
-    category = instance.category
-    amount = int(instance.amount)
-    owner = instance.owner
-    try:
-        total_expense = TotalExpense.objects.get(category=category, owner=owner)
-        current_total = int(total_expense.amount)
-        total_expense.amount = current_total + amount
-        total_expense.save()
-    except TotalExpense.DoesNotExist:
-        TotalExpense.objects.create(category=category, amount=amount, owner=owner)
+def update_total_expense(sender, instance, using, **kwargs):
+    # The budget counters first: rollups.after_save() replaces the remembered previous state.
+    budgets.after_save(instance, using)
+    rollups.after_save(TotalExpense, instance, 'category')
 
-@receiver(pre_save, sender=Expense)
-def check_expense_limit(sender, instance, **kwargs):
-    today = datetime.datetime.now().date()
-    count = Expense.objects.filter(owner=instance.owner, date=today).count()
-    if count > 10:
-        raise ValueError('Maximum number of expenses reached for today')
+@receiver(post_delete, sender=Expense)
+def remove_from_total_expense(sender, instance, using, **kwargs):
+    budgets.after_delete(instance, using)
+    rollups.after_delete(TotalExpense, instance, 'category')
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def bump_expense_version(sender, instance, using, **kwargs):
+    bump_version(instance.owner_id, using)
 
+@login_required(login_url='/authentication/login')
+@conditional_on_data
+@read_replica
 def search_expenses(request):
-    if request.method == 'POST':
-        search_str = json.loads(request.body).get('searchText')
-        expenses = Expense.objects.filter(amount__istartswith=search_str, owner=request.user) | Expense.objects.filter(date__istartswith=search_str, owner=request.user) | Expense.objects.filter(description__icontains=search_str, owner=request.user) | Expense.objects.filter(category__icontains=search_str, owner=request.user)
-        data = expenses.values()
-        return JsonResponse(list(data), safe=False)
+    if request.method in ('GET', 'POST'):
+        body = json.loads(request.body) if request.method == 'POST' else request.GET
+        search_str = body.get('searchText', '')
+        # A date search (2021, 2021-03, ...) reaching back past the archive horizon also lists archived rows.
+        archived = archived_window(Expense, request.user.pk, *(date_range(search_str) or (None, None)))
+        data = search_page(Expense.objects.filter(owner=request.user), ('description', 'category'), search_str,
+                           ('id', 'amount', 'currency', 'category', 'description', 'date'), get_limit(body.get('limit')), body.get('cursor'),
+                           archived)
+        return JsonResponse(data)
 
 
 @login_required(login_url='/authentication/login')
 def index(request):
     expenses = Expense.objects.filter(owner = request.user)
-    paginator = Paginator(expenses, 5)
-    page_number = request.GET.get('page')
-    page_obj = Paginator.get_page(paginator, page_number)
-    if UserPreference.objects.filter(user= request.user).exists():
-        currency = UserPreference.objects.get(user= request.user).currency
-    else:
-        currency = 'INR'
+    try:
+        page_obj = keyset_page(expenses, request.GET.get('cursor'), get_page_size(request))
+    except ValueError:
+        page_obj = keyset_page(expenses, None, get_page_size(request))
+    currency = request.preferences.currency
     context = {
-        'expenses': expenses,
         'page_obj': page_obj,
+        'page_sizes': PAGE_SIZES,
+        'total': expenses.count() if request.GET.get('count') else None,
         'currency': currency
     }
     return render(request, "expenses/index.html",context)
@@ -85,11 +114,61 @@ def add_expense(request):
             messages.error(request, "Description is required")
             return render(request, "expenses/add_expense.html", context)
 
-        Expense.objects.create(owner=request.user, amount=amount, category=category, description=description, date=date)
+        retry_after = consume(request.user.pk, 'expense')
+        if retry_after:
+            messages.error(request, 'Maximum number of expenses reached for today')
+            return limited_response(render(request, "expenses/add_expense.html", context), retry_after)
+
+        with sharding.atomic(request.user.pk):
+            expense = Expense.objects.create(owner=request.user, amount=amount, currency=stored_currency(request.user),
+                                   category=category, description=description, date=date)
         messages.success(request, 'Expense saved successfully.')
+        for alert in expense.budget_alerts:
+            messages.warning(request, str(alert))
         
         return redirect('expenses')
 
+@login_required(login_url='/authentication/login')
+def import_expenses(request):
+    categories = Category.objects.all()
+    context = {
+        'categories': categories
+    }
+
+    if request.method == 'GET':
+        return render(request, "expenses/import.html", context)
+
+    if request.method == 'POST':
+        upload = request.FILES.get('statement')
+        if not upload:
+            messages.error(request, "Please choose a CSV or OFX file")
+            return render(request, "expenses/import.html", context)
+
+        retry_after = consume(request.user.pk, 'import')
+        if retry_after:
+            messages.error(request, 'Maximum number of imports reached for today')
+            return limited_response(render(request, "expenses/import.html", context), retry_after)
+
+        if upload.name.lower().endswith(('.ofx', '.qfx')):
+            rows = importers.parse_ofx(upload.file, income=False)
+        else:
+            rows = importers.parse_csv(upload.file, 'category')
+        try:
+            result = importers.import_rows(Expense, TotalExpense, 'category', request.user, rows, request.POST.get('category'),
+                                           stored_currency(request.user))
+        except importers.UnreadableFile as ex:
+            messages.error(request, str(ex))
+            return render(request, "expenses/import.html", context, status=400)
+
+        if result.created:
+            messages.success(request, f'Imported {result.created} expenses.')
+        if result.failed:
+            messages.error(request, f'{result.failed} rows were skipped.')
+        for alert in result.alerts:
+            messages.warning(request, str(alert))
+        context['result'] = result
+        return render(request, "expenses/import.html", context)
+
 @login_required(login_url='/authentication/login')
 def edit_expense(request, id):
     expense = Expense.objects.get(pk=id)
@@ -113,74 +192,167 @@ def edit_expense(request, id):
             messages.error(request, "Description is required")
             return render(request, "expenses/edit-expense.htmll", context)
 
-        expense.owner = request.user
-        expense.amount = amount
-        expense.description = description
-        expense.category = category
-        expense.date = date
+        retry_after = consume(request.user.pk, 'expense')
+        if retry_after:
+            messages.error(request, 'Maximum number of expenses reached for today')
+            return limited_response(render(request, "expenses/edit-expense.html", context), retry_after)
 
-        expense.save()
+        with sharding.atomic(request.user.pk) as db:
+            # Lock the row and re-read it, so the rollup delta is taken against what it holds now
+            # rather than the copy loaded above, which a concurrent edit may have changed.
+            expense = Expense.objects.using(db).select_for_update().get(pk=id)
+            expense.owner = request.user
+            expense.amount = amount
+            expense.description = description
+            expense.category = category
+            expense.date = date
+            expense.save()
         messages.success(request, 'Expense updated successfully.')
+        for alert in expense.budget_alerts:
+            messages.warning(request, str(alert))
 
         return redirect('expenses')
 
 
 def delete_expense(request, id):
-    expense = Expense.objects.get(pk=id)
-    expense.delete()
+    with sharding.atomic(request.user.pk) as db:
+        expense = Expense.objects.using(db).select_for_update().get(pk=id)
+        expense.delete()
     messages.success(request, 'Expense removed.')
     return redirect('expenses')
 
 
+@login_required(login_url='/authentication/login')
+@conditional_on_date
+@read_replica
 def expense_category_summary(request):
-    todays_date = datetime.date.today()
-    six_months_ago = todays_date - datetime.timedelta(days= 30*6)
-    expenses = Expense.objects.filter(owner = request.user, date__gte = six_months_ago, date__lte = todays_date)
-    
-    finalrep = {}
-    def get_category(expense):
-        return expense.category
+    try:
+        date_from, date_to = get_date_window(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date range, use ?from=YYYY-MM-DD&to=YYYY-MM-DD'}, status=400)
+    currency = currency_code(request.preferences.currency)
 
-    def get_expense_category_amount(category):
-        amount = 0
-        filtered_by_category = expenses.filter(category = category)
-        for item in filtered_by_category:
-            amount += item.amount
-        return amount
+    def summarize():
+        # ledger() reads the archive horizon, a cache hit needs neither.
+        expenses = ledger(Expense, request.user.pk, date_from, date_to)
+        unconverted = {}
+        return summarize_ledger(expenses, 'category', currency, unconverted), unconverted
 
-    category_list = list(set(map(get_category, expenses)))
+    finalrep, unconverted = cached_result(request.user.pk, 'expense_category_summary', (date_from, date_to, currency), summarize)
+    return JsonResponse({'expense_category_data': finalrep, 'unconverted': unconverted}, safe= False)
+
+@login_required(login_url='/authentication/login')
+@conditional_on_date
+@read_replica
+def expense_category_series(request):
+    granularity = request.GET.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        return JsonResponse({'error': 'granularity must be one of day, week, month'}, status=400)
+    try:
+        date_from, date_to = get_date_window(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date range, use ?from=YYYY-MM-DD&to=YYYY-MM-DD'}, status=400)
+    expenses = ledger(Expense, request.user.pk, date_from, date_to)
+    categories = request.GET.getlist('category')
+    if categories:
+        expenses = [part.filter(category__in = categories) for part in expenses]
+    return JsonResponse({'expense_category_series': bucket_series(expenses, 'category', granularity, date_from, date_to,
+                                                                  currency_code(request.preferences.currency))})
+
+@login_required(login_url='/authentication/login')
+@conditional_on_date
+@read_replica
+def cash_flow_data(request):
+    granularity = request.GET.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        return JsonResponse({'error': 'granularity must be one of day, week, month'}, status=400)
+    try:
+        date_from, date_to = get_date_window(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date range, use ?from=YYYY-MM-DD&to=YYYY-MM-DD'}, status=400)
+    data = cash_flow(request.user.pk, date_from, date_to, granularity, currency_code(request.preferences.currency))
+    return JsonResponse({'cash_flow': data})
 
-    for expense in expenses:
-        for category in category_list:
-            finalrep[category] = get_expense_category_amount(category)
+@login_required(login_url='/authentication/login')
+def dashboard(request):
+    return render(request, 'expenses/dashboard.html', {'currency': request.preferences.currency})
 
-    return JsonResponse({'expense_category_data': finalrep}, safe= False)
+@user_passes_test(lambda user: user.is_staff, login_url='/authentication/login')
+def result_cache_stats(request):
+    return JsonResponse({'result_cache': cache_stats()})
 
+@login_required(login_url='/authentication/login')
+@conditional_on_date
+@read_replica
 def stats_view(request):
-    total_expenses= TotalExpense.objects.filter(owner = request.user)
+    currency = request.preferences.currency
+
+    def summarize():
+        unconverted = {}
+        return summarize_by(TotalExpense.objects.filter(owner = request.user), 'category', currency_code(currency), unconverted), unconverted
+
+    totals, unconverted = cached_result(request.user.pk, 'expense_stats', (currency_code(currency),), summarize)
+    total_expenses = [{'category': key, 'amount': amount} for key, amount in sorted(totals.items())]
     paginator = Paginator(total_expenses, 5)
     page_number = request.GET.get('page')
     page_obj = Paginator.get_page(paginator, page_number)
-    if UserPreference.objects.filter(user= request.user).exists():
-        currency = UserPreference.objects.get(user= request.user).currency
-    else:
-        currency = 'INR'
     context = {
         'total_expenses': total_expenses,
         'page_obj': page_obj,
-        'currency': currency
+        'currency': currency,
+        'unconverted': unconverted,
     }
     return render(request, 'expenses/stats.html', context)
 
+@login_required(login_url='/authentication/login')
+@conditional_on_data
+@read_replica
 def export_csv(request):
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=Expenses'+str(datetime.datetime.now())+'.csv'
-    writer = csv.writer(response)
-    writer.writerow(['Amount', 'Description', 'Category', 'Date'])
+    try:
+        # The rows are streamed after the view returns, so fix the database now.
+        db = router.db_for_read(Expense)
+        expenses = [filter_export(request, Expense.objects.using(db).filter(owner =request.user), 'category')]
+        # An explicit ?from= before the archive horizon exports the archived rows after the live ones.
+        archived = archived_window(Expense, request.user.pk, export_start(request), None)
+        if archived is not None:
+            expenses.append(filter_export(request, archived.using(db), 'category'))
+    except ValueError:
+        return HttpResponse('Invalid date, use YYYY-MM-DD', status=400)
+    currency = currency_code(request.preferences.currency)
+    converted = Cast(converted_amount(currency), DecimalField(max_digits=20, decimal_places=2))
+    rows = itertools.chain.from_iterable(
+        part.annotate(converted=converted).values_list('amount', 'currency', 'converted', 'description', 'category', 'date')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE) for part in expenses)
+    return csv_response(request, 'Expenses', ['Amount', 'Currency', f'Amount ({currency})', 'Description', 'Category', 'Date'], rows)
+
+@login_required(login_url='/authentication/login')
+def set_budget(request):
+    """POST category and a monthly amount in the preferred currency; an empty or zero amount removes the budget."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    category = request.POST.get('category', '').strip()
+    if not category:
+        return JsonResponse({'error': 'category is required'}, status=400)
+    try:
+        amount = Decimal(request.POST.get('amount') or 0)
+        if not amount.is_finite():
+            raise InvalidOperation
+        amount = amount.quantize(CENTS)
+    except InvalidOperation:
+        return JsonResponse({'error': 'amount must be a number'}, status=400)
+    if amount < 0 or amount > MAX_AMOUNT:
+        return JsonResponse({'error': 'amount must be positive and fit 10 digits'}, status=400)
 
-    expenses = Expense.objects.filter(owner =request.user)
-    for expense in expenses:
-        writer.writerow([expense.amount, expense.description, expense.category, expense.date])
+    with sharding.atomic(request.user.pk):
+        if amount:
+            Budget.objects.update_or_create(owner=request.user, category=category,
+                                            defaults={'amount': amount, 'currency': stored_currency(request.user)})
+        else:
+            Budget.objects.filter(owner=request.user, category=category).delete()
+    return JsonResponse({'budget_status': budgets.status(request.user.pk)})
 
-    return response
\ No newline at end of file
+@login_required(login_url='/authentication/login')
+@conditional_on_date
+@read_replica
+def budget_status(request):
+    return JsonResponse({'budget_status': budgets.status(request.user.pk)})
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+# Settings naming a cache alias that every process has to read and write the same way,
+# with the alias used when the setting is absent.
+SHARED_CACHE_SETTINGS = {
+    'RATE_LIMIT_CACHE': 'default',
+    'DATA_VERSION_CACHE': 'default',
+    'RESULT_CACHE': 'default',
+}
+
+
+def is_shared(cache):
+    # A per-process cache never sees the writes of the other processes.
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    errors = []
+    shared = dict(SHARED_CACHE_SETTINGS)
+    if settings.SESSION_ENGINE.startswith('django.contrib.sessions.backends.cache'):
+        shared['SESSION_CACHE_ALIAS'] = 'default'
+    for setting, default in shared.items():
+        alias = getattr(settings, setting, default)
+        if not is_shared(caches[alias]):
+            errors.append(Error(
+                f'The per-process cache {alias!r} would give each worker its own copy.',
+                hint='Set CACHE_URL to a cache server shared by all processes.',
+                obj=setting,
+                id='expensetracker.E001',
+            ))
+    return errors
@@ -0,0 +1,99 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(sql):
+    """Collapse literals and IN-lists so repeated shapes of the same query compare equal."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class QueryRecorder:
+    """An execute_wrapper that counts, times and fingerprints every query it sees."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self, threshold):
+        return {sql: count for sql, count in self.fingerprints.items() if count >= threshold}
+
+
+@contextmanager
+def record_queries(using=None):
+    recorder = QueryRecorder()
+    aliases = [using] if using else connections
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+@contextmanager
+def query_budget(max_queries, duplicate_threshold=None, using=None):
+    """Test helper: fail if the block runs more than ``max_queries`` or repeats one query shape.
+
+        with query_budget(3, duplicate_threshold=2):
+            self.client.get('/expense-category-summary')
+    """
+    with record_queries(using) as recorder:
+        yield recorder
+    if recorder.count > max_queries:
+        raise AssertionError(f'{recorder.count} queries executed, budget is {max_queries}:\n'
+                             + '\n'.join(recorder.fingerprints))
+    if duplicate_threshold:
+        duplicates = recorder.duplicates(duplicate_threshold)
+        if duplicates:
+            raise AssertionError('Repeated queries (possible N+1):\n'
+                                 + '\n'.join(f'{count}x {sql}' for sql, count in duplicates.items()))
+
+
+class QueryInstrumentationMiddleware:
+    """Opt-in with SQL_INSTRUMENTATION = True.
+
+    Adds a Server-Timing header with the query count and DB time of each request and logs a
+    warning when a view goes over SQL_QUERY_BUDGET or repeats one query SQL_DUPLICATE_THRESHOLD
+    times. Queries issued while a streaming response is being consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budget = getattr(settings, 'SQL_QUERY_BUDGET', 20)
+        self.duplicate_threshold = getattr(settings, 'SQL_DUPLICATE_THRESHOLD', 5)
+
+    def __call__(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+
+        timing = f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"'
+        if response.has_header('Server-Timing'):
+            timing = response['Server-Timing'] + ', ' + timing
+        response['Server-Timing'] = timing
+
+        if recorder.count > self.budget:
+            logger.warning('%s %s ran %d queries (budget %d)', request.method, request.path, recorder.count, self.budget)
+        for sql, count in recorder.duplicates(self.duplicate_threshold).items():
+            logger.warning('%s %s repeated a query %d times: %s', request.method, request.path, count, sql)
+        return response
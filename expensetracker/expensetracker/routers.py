@@ -0,0 +1,138 @@
+import functools
+from contextvars import ContextVar
+from django.conf import settings
+from . import sharding
+
+DEFAULT_STICKY_SECONDS = 10
+PIN_COOKIE = 'dbpin'
+
+# Per-request routing state, installed by ReplicaRoutingMiddleware.
+_routing = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, user=None):
+        self.user = user
+        self.use_replica = False
+        self.wrote = False
+
+    @property
+    def owner_id(self):
+        # request.user is lazy, only shard routing resolves it.
+        user = self.user
+        return user.pk if user is not None and user.is_authenticated else None
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+
+
+def pin_to_primary(response, user_id):
+    """Send the client's reads to the primary for REPLICA_STICKY_SECONDS (read-your-writes).
+
+    The pin travels in a signed cookie, so whichever process serves the next request sees it.
+    """
+    response.set_signed_cookie(PIN_COOKIE, str(user_id), salt=PIN_COOKIE, max_age=sticky_seconds(),
+                               httponly=True, samesite='Lax')
+
+
+def is_pinned(request):
+    pinned = request.get_signed_cookie(PIN_COOKIE, default=None, salt=PIN_COOKIE, max_age=sticky_seconds())
+    return pinned is not None and pinned == str(request.user.pk)
+
+
+class ReplicaRouter:
+    """Reads from views marked @read_replica go to REPLICA_DATABASE, everything else to default.
+
+    Does nothing unless REPLICA_DATABASE names a configured alias.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state and state.use_replica and not state.wrote:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state and model._meta.app_label != 'sessions':
+            # Later reads in this request, and the user's next requests, must see this write.
+            state.wrote = True
+        return 'default' if replica_alias() else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+
+class ShardRouter:
+    """Rows of sharding.SHARDED_MODELS go to their owner's shard.
+
+    The owner comes from an ``instance`` hint, an ``owner_id`` hint or the request's user; queries
+    without any fall through to the next router. Does nothing unless SHARDS names two or more aliases.
+    """
+
+    def shard(self, model, hints):
+        if not sharding.is_sharded(model) or len(sharding.shard_aliases()) < 2:
+            return None
+        owner_id = hints.get('owner_id') or sharding.owner_of(hints.get('instance'))
+        if owner_id is None:
+            state = _routing.get()
+            owner_id = state.owner_id if state else None
+        if owner_id is None:
+            return None
+        return sharding.shard_for(owner_id)
+
+    def db_for_read(self, model, **hints):
+        return self.shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Owner foreign keys are declared without a database constraint for this.
+        return True
+
+
+def read_replica(view):
+    """Serve a read-only view from the replica unless the user wrote recently."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _routing.get()
+        if state is not None and replica_alias():
+            state.use_replica = not (request.user.is_authenticated and is_pinned(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            if state is not None:
+                state.use_replica = False
+    return wrapper
+
+
+class ReplicaRoutingMiddleware:
+    """Track writes per request and pin the writer to the primary for a while afterwards.
+
+    Also makes request.user the owner ShardRouter routes the request's queries by, reading shard
+    assignments once per request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState(request.user)
+        token = _routing.set(state)
+        try:
+            with sharding.remembered_assignments():
+                response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if state.wrote and replica_alias() and request.user.is_authenticated:
+            pin_to_primary(response, request.user.pk)
+        return response
@@ -43,15 +43,19 @@ INSTALLED_APPS = [
     'expenses',
     'userpreferences',
     'userincome',
+    'authentication',
 ]
 
 MIDDLEWARE = [
+    'expensetracker.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'expensetracker.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'userpreferences.middleware.PreferenceMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -89,6 +93,65 @@ DATABASES = {
     }
 }
 
+# Views marked @read_replica read from this alias when it exists in DATABASES; a user's reads
+# stay on the primary for REPLICA_STICKY_SECONDS after they write. See expensetracker.routers
+REPLICA_DATABASE = 'replica'
+REPLICA_STICKY_SECONDS = 10
+
+# Each user's expenses, income, rollups and preferences live on one of these aliases, see
+# expensetracker.sharding. Every alias needs `migrate --database <alias>`.
+SHARDS = ['default']
+
+DATABASE_ROUTERS = ['expensetracker.routers.ShardRouter', 'expensetracker.routers.ReplicaRouter']
+
+
+# Quotas, data versions and cached results must look the same from every process, so
+# production sets CACHE_URL to a Redis server; `manage.py check --deploy` fails on a
+# per-process cache (see expensetracker.checks). Without it a single runserver process is fine.
+CACHE_URL = os.environ.get('CACHE_URL')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        },
+        # Aggregate results (see expenses.resultcache); give Redis an LRU maxmemory-policy.
+        'results': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'results',
+            'TIMEOUT': 60*10,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        # Aggregate results (see expenses.resultcache); LocMemCache culls least recently used entries.
+        'results': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'results',
+            'TIMEOUT': 60*10,
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        },
+    }
+RESULT_CACHE = 'results'
+
+# Per-user data-version stamps behind the ETags and result keys, see expenses.versioning. A write
+# in one process has to change the stamp every other process answers with.
+DATA_VERSION_CACHE = 'default'
+
+# Sessions and the logged-in User are read through the cache, see authentication.backends.
+# Both are only cached in a cache shared by all processes, or a logout on one worker would not
+# reach the others; the User once AUTH_USER_CACHE points at one, sessions once CACHE_URL is set.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db' if CACHE_URL else 'django.contrib.sessions.backends.db'
+AUTHENTICATION_BACKENDS = ['authentication.backends.CachedModelBackend']
+AUTH_USER_CACHE = 'default'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -136,6 +199,30 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Per-request query count/DB time in a Server-Timing header, with warnings over budget
+SQL_INSTRUMENTATION = False
+SQL_QUERY_BUDGET = 20
+SQL_DUPLICATE_THRESHOLD = 5
+
+# Per-user daily write quotas (see expenses.ratelimit), counted in this cache alias
+RATE_LIMITS = {
+    'expense': 10,
+    'import': 20,
+}
+RATE_LIMIT_CACHE = 'default'
+
+# Seconds each process keeps its copy of the exchange rate table before re-reading it, so rates
+# loaded with `manage.py load_fx_rates` reach running servers. See userpreferences.fx
+FX_RATES_MAX_AGE = 60
+
+# Dotted path to an expenses.search.SearchBackend subclass, None picks one from the database vendor
+SEARCH_BACKEND = None
+
+# Percentages of a monthly category budget that alert the owner once per month, with a message
+# and, when BUDGET_ALERT_EMAIL is set, an email through the outbox. See expenses.budgets
+BUDGET_ALERT_THRESHOLDS = (80, 100)
+BUDGET_ALERT_EMAIL = True
+
 MESSAGE_TAGS = {
     messages.ERROR : 'danger'
 }
@@ -147,3 +234,6 @@ EMAIL_USE_TLS = True
 DEFAILT_FROM_EMAIL = '***************'
 EMAIL_PORT = 587
 EMAIL_HOST_PASSWORD = '*****************'
+
+# In-process threads draining the email outbox; set to 0 and run `manage.py send_outbox --loop` instead
+EMAIL_OUTBOX_WORKERS = 1
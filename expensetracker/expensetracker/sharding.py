@@ -0,0 +1,208 @@
+"""Owner-based sharding: every row of SHARDED_MODELS lives on its owner's database.
+
+A user's shard is recorded in authentication.ShardAssignment (on the default database) the first
+time it is needed, picked by a stable hash over SHARDS. Adding a shard later therefore only places
+new users there; existing users move with ``manage.py rebalance_shards``. See routers.ShardRouter.
+
+The assignment is read from the database, at most once per request, so every process sees a
+move as soon as it commits. Writes go through atomic(), which holds the assignment row for the
+whole write.
+"""
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+# Sharded model -> the foreign key naming its owner.
+SHARDED_MODELS = {
+    'expenses.expense': 'owner',
+    'expenses.totalexpense': 'owner',
+    'userincome.userincome': 'owner',
+    'userincome.totalincome': 'owner',
+    'userpreferences.userpreference': 'user',
+    'expenses.archivedexpense': 'owner',
+    'userincome.archivedincome': 'owner',
+    'expenses.budget': 'owner',
+    'expenses.budgetspend': 'owner',
+}
+# {user_id: (alias, generation)} read during the current request, see remembered_assignments().
+_assignments = ContextVar('shard_assignments', default=None)
+# {user_id: alias} of the assignments held by the atomic() blocks around the current code.
+_locked = ContextVar('locked_shards', default=None)
+
+
+def shard_aliases():
+    return [alias for alias in getattr(settings, 'SHARDS', ['default']) if alias in settings.DATABASES]
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def sharded_models():
+    return [apps.get_model(label) for label in SHARDED_MODELS]
+
+
+def owner_of(instance):
+    """The user id an instance hint belongs to: the user itself, or a sharded row's owner."""
+    if instance is None:
+        return None
+    label = instance._meta.label_lower
+    if label == 'auth.user':
+        return instance.pk
+    if label in SHARDED_MODELS:
+        return getattr(instance, SHARDED_MODELS[label] + '_id')
+    return None
+
+
+def hashed_shard(user_id, aliases=None):
+    aliases = aliases or shard_aliases()
+    return aliases[zlib.crc32(str(user_id).encode()) % len(aliases)]
+
+
+def assignments():
+    return apps.get_model('authentication', 'ShardAssignment').objects.using('default')
+
+
+def placement(user_id):
+    """(alias, generation) of the user's assignment, recorded from the hash placement on first use."""
+    remembered = _assignments.get()
+    if remembered is not None and user_id in remembered:
+        return remembered[user_id]
+    assignment, _ = assignments().get_or_create(user_id=user_id, defaults={'alias': hashed_shard(user_id)})
+    found = (assignment.alias, assignment.generation)
+    if remembered is not None:
+        remembered[user_id] = found
+    return found
+
+
+@contextmanager
+def remembered_assignments():
+    """Read each user's assignment once for the duration of the block, installed around requests."""
+    token = _assignments.set({})
+    try:
+        yield
+    finally:
+        _assignments.reset(token)
+
+
+def shard_for(user_id):
+    locked = _locked.get()
+    if locked and user_id in locked:
+        return locked[user_id]
+    return placement(user_id)[0]
+
+
+def primary_for(user_id):
+    """The database holding the user's rows, without going through the routers."""
+    return shard_for(user_id) if len(shard_aliases()) > 1 else 'default'
+
+
+@contextmanager
+def atomic(user_id):
+    """transaction.atomic() on the user's shard, yielding its alias; use it for every write of their rows.
+
+    The assignment row is locked and its generation bumped until the write commits, so move_user
+    can neither switch the user in the middle of it nor miss it in a copy.
+    """
+    if len(shard_aliases()) < 2:
+        with transaction.atomic(using='default'):
+            yield 'default'
+        return
+    assignment = assignments().filter(user_id=user_id)
+    with transaction.atomic(using='default'):
+        if not assignment.update(generation=F('generation') + 1):
+            placement(user_id)
+            assignment.update(generation=F('generation') + 1)
+        alias, generation = assignment.values_list('alias', 'generation').get()
+        remembered = _assignments.get()
+        if remembered is not None:
+            remembered[user_id] = (alias, generation)
+        token = _locked.set({**(_locked.get() or {}), user_id: alias})
+        try:
+            with transaction.atomic(using=alias):
+                yield alias
+        finally:
+            _locked.reset(token)
+
+
+def owned(model, user_id, alias):
+    return model._default_manager.using(alias).filter(**{SHARDED_MODELS[model._meta.label_lower] + '_id': user_id})
+
+
+def copy_rows(user_id, source, target, batch_size):
+    copied = 0
+    for model in sharded_models():
+        last = 0
+        while True:
+            batch = list(owned(model, user_id, source).filter(pk__gt=last).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            last = batch[-1].pk
+            for obj in batch:
+                # Ids come from each database's own sequence.
+                obj.pk = None
+            # bulk_create skips the save receivers, the rollup rows are copied as they are.
+            model._default_manager.using(target).bulk_create(batch)
+            copied += len(batch)
+    return copied
+
+
+def purge_rows(user_id, alias, batch_size):
+    connection = connections[alias]
+    for model in sharded_models():
+        table = connection.ops.quote_name(model._meta.db_table)
+        pk = connection.ops.quote_name(model._meta.pk.column)
+        while True:
+            ids = list(owned(model, user_id, alias).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            # Plain DELETEs: the delete receivers would take the amounts off the user's live rollups.
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({", ".join(["%s"] * len(ids))})', ids)
+
+
+def move_user(user_id, target, batch_size=1000, attempts=3):
+    """Copy a user's rows to ``target`` while they keep using the site, then switch them over.
+
+    The switch is a conditional UPDATE on the assignment's generation: any write committed
+    during the copy bumped it (see atomic()), and then the copy is redone. Returns the number
+    of rows copied, or None if the user never stayed idle for a whole copy.
+    """
+    from expenses.versioning import bump_version
+    from userpreferences.middleware import cache_key as preferences_key
+
+    for _ in range(attempts):
+        source, generation = assignments().values_list('alias', 'generation').get(user_id=user_id)
+        if source == target:
+            return 0
+        # Also clears what an interrupted move left behind.
+        purge_rows(user_id, target, batch_size)
+        copied = copy_rows(user_id, source, target, batch_size)
+        # Waits on the row lock of a write still in progress, whose bump then fails the switch.
+        if assignments().filter(user_id=user_id, alias=source, generation=generation).update(
+                alias=target, generation=F('generation') + 1):
+            break
+    else:
+        purge_rows(user_id, target, batch_size)
+        return None
+    purge_rows(user_id, source, batch_size)
+    # Row ids changed: drop cached preferences and results that still point at the old ones.
+    cache.delete(preferences_key(user_id))
+    bump_version(user_id)
+    return copied
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_sharded_rows(sender, instance, using, **kwargs):
+    # The delete cascade only reaches the database the user is deleted from.
+    if len(shard_aliases()) > 1:
+        alias = shard_for(instance.pk)
+        if alias != using:
+            purge_rows(instance.pk, alias, 1000)
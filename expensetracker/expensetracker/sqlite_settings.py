@@ -0,0 +1,26 @@
+"""Local settings without Postgres: DJANGO_SETTINGS_MODULE=expensetracker.sqlite_settings
+
+'replica' is a second SQLite file standing in for a read replica; nothing copies rows into it.
+Set REPLICA_DATABASE = 'replica' to send the reporting views there. 'shard1' is a second shard,
+add it to SHARDS to spread users over both files. The router tests in expenses/tests.py switch
+these on themselves, against separate test databases.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+    },
+    'shard1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-shard1.sqlite3',
+    },
+}
+REPLICA_DATABASE = None
+SHARDS = ['default']
@@ -0,0 +1,66 @@
+const renderFlowChart = (flow) => {
+  new Chart(document.getElementById("flowChart"), {
+    type: "bar",
+    data: {
+      labels: flow.labels,
+      datasets: [
+        {
+          label: "Income",
+          data: flow.income,
+          backgroundColor: "rgba(75,192,192,0.2)",
+          borderColor: "rgba(75,192,192,1)",
+          borderWidth: 1,
+        },
+        {
+          label: "Expenses",
+          data: flow.expense,
+          backgroundColor: "rgba(255,99,132,0.2)",
+          borderColor: "rgba(255,99,132,1)",
+          borderWidth: 1,
+        },
+      ],
+    },
+    options: {
+      scales: {
+        y: {
+          beginAtZero: true,
+        },
+      },
+    },
+  });
+};
+
+const renderBalanceChart = (flow) => {
+  new Chart(document.getElementById("balanceChart"), {
+    type: "line",
+    data: {
+      labels: flow.labels,
+      datasets: [
+        {
+          label: "Net",
+          data: flow.net,
+          borderColor: "rgba(255,159,64,1)",
+          borderWidth: 1,
+        },
+        {
+          label: "Balance",
+          data: flow.balance,
+          borderColor: "rgba(54,99,235,1)",
+          borderWidth: 1,
+        },
+      ],
+    },
+  });
+};
+
+const getDashboardData = () => {
+  fetch("cash-flow")
+    .then((res) => res.json())
+    .then((results) => {
+      const flow = results.cash_flow;
+      renderFlowChart(flow);
+      renderBalanceChart(flow);
+    });
+};
+
+document.onload = getDashboardData();
@@ -3,42 +3,91 @@ const tableOutput = document.querySelector('.table-output');
 const appTable = document.querySelector('.app-table');
 const paginationContainer = document.querySelector('.pagination-conatiner');
 const tBody = document.querySelector('.table-body');
+const noResults = document.querySelector('.no-results');
+const loadMore = document.querySelector('.load-more');
 tableOutput.style.display = "none";
 
-searchField.addEventListener('keyup', (e)=>{
+const SEARCH_DELAY = 250;
+let searchTimer = null;
+let controller = null;
+let nextCursor = null;
+
+const renderRows = (payload, append) => {
+    const col = Object.fromEntries(payload.columns.map((name, i) => [name, i]));
+    const fragment = document.createDocumentFragment();
+    payload.rows.forEach(row => {
+        const tr = document.createElement('tr');
+        ['amount', 'source', 'description', 'date'].forEach(name => {
+            const td = document.createElement('td');
+            td.textContent = name === 'amount' ? `${row[col.amount]} ${row[col.currency]}` : row[col[name]];
+            tr.appendChild(td);
+        });
+        const edit = document.createElement('td');
+        // Archived rows come back without an id and cannot be edited.
+        if (row[col.id] !== null) {
+            const link = document.createElement('a');
+            link.href = `/income/edit-income/${row[col.id]}`;
+            link.className = 'btn btn-secondary';
+            link.textContent = 'Edit';
+            edit.appendChild(link);
+        }
+        tr.appendChild(edit);
+        fragment.appendChild(tr);
+    });
+    if (!append) {
+        tBody.replaceChildren();
+    }
+    tBody.appendChild(fragment);
+    noResults.style.display = tBody.children.length === 0 ? 'block' : 'none';
+    nextCursor = payload.next;
+    loadMore.style.display = nextCursor ? 'inline-block' : 'none';
+};
+
+const runSearch = (searchValue, cursor) => {
+    if (controller) {
+        controller.abort();
+    }
+    controller = new AbortController();
+    // GET so the browser can revalidate repeated searches with If-None-Match.
+    const params = new URLSearchParams({ 'searchText': searchValue });
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    fetch(`/income/search-income?${params}`, {
+        signal: controller.signal,
+      })
+        .then((res) => res.json())
+        .then((payload) => {
+            appTable.style.display = 'none';
+            tableOutput.style.display = 'block';
+            renderRows(payload, Boolean(cursor));
+        })
+        .catch((err) => {
+            if (err.name !== 'AbortError') {
+                throw err;
+            }
+        });
+};
+
+searchField.addEventListener('input', (e)=>{
     const searchValue = e.target.value;
+    clearTimeout(searchTimer);
 
     if (searchValue.trim().length >0){
         paginationContainer.style.display = 'none';
-        tBody.innerHTML = ""
-        fetch("/income/search-income", {
-            body: JSON.stringify({ 'searchText': searchValue }),
-            method: "POST",
-          })
-            .then((res) => res.json())
-            .then((data) => {
-                console.log('data', data);
-                appTable.style.display = 'none';
-                tableOutput.style.display = 'block';
-                if (data.length === 0){
-                    tableOutput.innerHTML = 'No results found';
-                }else{
-                    data.forEach(item => {
-                        tBody.innerHTML += `
-                    <tr>
-                        <td>${item.amount}</td>
-                        <td>${item.source}</td>
-                        <td>${item.description}</td>
-                        <td>${item.date}</td>
-                    </tr>`;
-                    });
-                    
-                }
-            });
+        searchTimer = setTimeout(() => runSearch(searchValue, null), SEARCH_DELAY);
     }else{
+        if (controller) {
+            controller.abort();
+        }
         tableOutput.style.display = 'none';
         appTable.style.display = 'block';
-        tableOutput.style.display = 'none';
         paginationContainer.style.display = 'block';
     }
-});
\ No newline at end of file
+});
+
+loadMore.addEventListener('click', () => {
+    if (nextCursor) {
+        runSearch(searchField.value, nextCursor);
+    }
+});
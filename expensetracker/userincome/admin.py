@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import UserIncome, Source
+from .models import UserIncome, Source, ArchivedIncome
 # Register your models here.
 admin.site.register(UserIncome)
-admin.site.register(Source)
\ No newline at end of file
+admin.site.register(Source)
+admin.site.register(ArchivedIncome)
\ No newline at end of file
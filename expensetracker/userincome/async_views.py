@@ -0,0 +1,49 @@
+import json
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponseNotAllowed
+from expenses.archive import archived_window, ledger
+from expenses.async_views import get_currency, get_user_id, login_required
+from expenses.resultcache import acached_result
+from expenses.search import asearch_page, date_range, get_limit
+from expenses.utils import get_date_window, asummarize_ledger
+from expenses.versioning import aconditional_on_data, aconditional_on_date
+from .models import UserIncome
+
+# Async twins of the read-only JSON endpoints in views.py, see expenses/async_views.py.
+
+
+@login_required
+@aconditional_on_data
+async def search_income(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    body = json.loads(request.body)
+    search_str = body.get('searchText', '')
+    owner_id = await get_user_id(request)
+    archived = await sync_to_async(archived_window)(UserIncome, owner_id, *(date_range(search_str) or (None, None)))
+    data = await asearch_page(UserIncome.objects.filter(owner_id=owner_id), ('description', 'source'), search_str,
+                              ('id', 'amount', 'currency', 'source', 'description', 'date'), get_limit(body.get('limit')), body.get('cursor'),
+                              archived)
+    return JsonResponse(data)
+
+# csrf_exempt() returns a sync wrapper before Django 5.0, so mark the coroutine directly.
+search_income.csrf_exempt = True
+
+
+@login_required
+@aconditional_on_date
+async def income_source_summary(request):
+    try:
+        date_from, date_to = get_date_window(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date range, use ?from=YYYY-MM-DD&to=YYYY-MM-DD'}, status=400)
+    owner_id = await get_user_id(request)
+    currency = await get_currency(request)
+
+    async def summarize():
+        incomes = await sync_to_async(ledger)(UserIncome, owner_id, date_from, date_to)
+        unconverted = {}
+        return await asummarize_ledger(incomes, 'source', currency, unconverted), unconverted
+
+    finalrep, unconverted = await acached_result(owner_id, 'income_source_summary', (date_from, date_to, currency), summarize)
+    return JsonResponse({'income_source_data': finalrep, 'unconverted': unconverted}, safe= False)
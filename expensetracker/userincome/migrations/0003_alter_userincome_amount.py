@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0002_totalincome'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userincome',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+from django.db.models import Sum
+
+
+def rebuild_total_income(apps, schema_editor):
+    # Earlier totals were accumulated with int() and re-added on every edit.
+    # Rollups gained a currency key later, so this step keeps its own copy of the old rebuild.
+    TotalIncome = apps.get_model('userincome', 'TotalIncome')
+    rows = apps.get_model('userincome', 'UserIncome').objects.order_by().values('owner_id', 'source').annotate(total=Sum('amount'))
+    TotalIncome.objects.all().delete()
+    TotalIncome.objects.bulk_create(TotalIncome(owner_id=row['owner_id'], amount=row['total'], source=row['source']) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_rebuild_totalexpense'),
+        ('userincome', '0003_alter_userincome_amount'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_total_income, migrations.RunPython.noop),
+    ]
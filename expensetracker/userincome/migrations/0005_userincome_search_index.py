@@ -0,0 +1,22 @@
+from django.db import migrations
+from expenses.search import create_search_index, drop_search_index
+
+
+def forwards(apps, schema_editor):
+    create_search_index(schema_editor, 'userincome_userincome', ('description', 'source'))
+
+
+def backwards(apps, schema_editor):
+    drop_search_index(schema_editor, 'userincome_userincome')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0006_expense_search_index'),
+        ('userincome', '0004_rebuild_totalincome'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0005_userincome_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='userincome',
+            options={'ordering': ['-date', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', '-date', '-id'], name='income_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', 'source', 'date'], name='income_owner_source_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='totalincome',
+            constraint=models.UniqueConstraint(fields=('owner', 'source'), name='unique_total_income'),
+        ),
+    ]
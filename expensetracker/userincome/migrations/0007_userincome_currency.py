@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:45
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def rebuild(model, source, field):
+    # Its own copy of rollups.rebuild as it was here: the live one also reads tables added later.
+    rows = source.objects.order_by().values('owner_id', field, 'currency').annotate(total=Sum('amount'))
+    model.objects.all().delete()
+    model.objects.bulk_create(model(owner_id=row['owner_id'], amount=row['total'], currency=row['currency'], **{field: row[field]})
+                              for row in rows)
+
+
+def backfill_income_currency(apps, schema_editor):
+    # Amounts were entered in whatever currency the owner had picked, so stamp them with it.
+    UserIncome = apps.get_model('userincome', 'UserIncome')
+    for user_id, currency in apps.get_model('userpreferences', 'UserPreference').objects.exclude(currency__isnull=True).exclude(currency='').values_list('user_id', 'currency'):
+        UserIncome.objects.filter(owner_id=user_id).update(currency=currency.partition(' - ')[0])
+    rebuild(apps.get_model('userincome', 'TotalIncome'), UserIncome, 'source')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userpreferences', '0001_initial'),
+        ('userincome', '0006_userincome_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='totalincome',
+            name='unique_total_income',
+        ),
+        migrations.AddField(
+            model_name='totalincome',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='userincome',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.RunPython(backfill_income_currency, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='totalincome',
+            constraint=models.UniqueConstraint(fields=('owner', 'source', 'currency'), name='unique_total_income'),
+        ),
+    ]
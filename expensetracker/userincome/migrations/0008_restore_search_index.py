@@ -0,0 +1,20 @@
+from django.db import migrations
+from expenses.search import create_search_index, drop_search_index
+
+
+def forwards(apps, schema_editor):
+    # On SQLite adding the currency column rebuilt the table, which dropped the FTS triggers.
+    if schema_editor.connection.vendor == 'sqlite':
+        drop_search_index(schema_editor, 'userincome_userincome')
+        create_search_index(schema_editor, 'userincome_userincome', ('description', 'source'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0007_userincome_currency'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('userincome', '0009_shardable_owner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedIncome',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date', models.DateField()),
+                ('description', models.TextField()),
+                ('source', models.CharField(max_length=255)),
+                ('currency', models.CharField(default='INR', max_length=3)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('owner', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+                'indexes': [models.Index(fields=['owner', '-date', '-id'], name='income_archive_date_idx')],
+            },
+        ),
+    ]
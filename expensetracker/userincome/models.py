@@ -1,19 +1,32 @@
 from django.db import models
 from django.utils.timezone import now
 from django.contrib.auth.models import User
+from userpreferences.currencies import DEFAULT_CURRENCY
+from expenses.rollups import remember_state
 # Create your models here.
 class UserIncome(models.Model):
-    amount = models.FloatField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField(default=now)
     description = models.TextField()
-    owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, db_constraint=False)
     source = models.CharField(max_length=255)
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
 
     def __str__(self) -> str:
         return self.source
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        remember_state(instance, 'source', field_names)
+        return instance
+
     class Meta:
-        ordering = ['-date']
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['owner', '-date', '-id'], name='income_owner_date_idx'),
+            models.Index(fields=['owner', 'source', 'date'], name='income_owner_source_idx'),
+        ]
 
 class Source(models.Model):
     name = models.CharField(max_length=255)
@@ -23,8 +36,34 @@ class Source(models.Model):
 
 class TotalIncome(models.Model):
     source = models.CharField(max_length=255)
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='incomes')
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='incomes', db_constraint=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'source', 'currency'], name='unique_total_income'),
+        ]
+
+    def __str__(self):
+        return f'{self.source} - {self.amount} - {self.owner}'
+
+
+class ArchivedIncome(models.Model):
+    # Old rows moved out of the live table by ``manage.py archive_ledger``, see expenses.archive.
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    date = models.DateField()
+    description = models.TextField()
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, db_constraint=False)
+    source = models.CharField(max_length=255)
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+    archived_at = models.DateTimeField(default=now)
+
+    class Meta:
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['owner', '-date', '-id'], name='income_archive_date_idx'),
+        ]
 
     def __str__(self):
-        return f'{self.source} - {self.amount} - {self.owner}'
\ No newline at end of file
+        return f'{self.source} - {self.amount} - {self.date}'
@@ -1,3 +1,71 @@
+import datetime
+import io
+import json
+from unittest import skipUnless
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from expenses.tests import QueryPlanMixin
+from .models import UserIncome
 
-# Create your tests here.
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are checked against SQLite')
+class IncomeQueryPlanTests(QueryPlanMixin, TestCase):
+    tables = ('userincome_userincome', 'userincome_totalincome')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='secret123')
+        other = User.objects.create_user('other', password='secret123')
+        today = datetime.date.today()
+        UserIncome.objects.bulk_create(
+            UserIncome(owner=owner, amount='1200.00', source=f'src{i % 5}', description=f'payroll {i}', date=today - datetime.timedelta(days=i))
+            for owner in (cls.user, other) for i in range(300)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_list(self):
+        self.assertIndexed(self.client.get, '/income/')
+
+    def test_summary(self):
+        self.assertIndexed(self.client.get, '/income/income-source-summary')
+
+    def test_search(self):
+        self.assertIndexed(self.client.post, '/income/search-income', data=json.dumps({'searchText': 'pay'}), content_type='application/json')
+
+    def test_export(self):
+        self.assertIndexed(self.client.get, '/income/export-csv', data={'from': '2024-01-01'})
+
+    def test_stats(self):
+        self.assertIndexed(self.client.get, '/income/stats')
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('async', password='secret123')
+        UserIncome.objects.create(owner=self.user, amount='20.00', source='Salary', description='old pay', date=datetime.date(2020, 3, 1))
+        call_command('archive_ledger', '--older-than', '2021-01-01', stdout=io.StringIO())
+        UserIncome.objects.create(owner=self.user, amount='50.00', source='Salary', description='pay')
+        UserIncome.objects.create(owner=self.user, amount='7.00', source='Interest', description='interest')
+        self.client.force_login(self.user)
+
+    def test_views_match_their_sync_twins(self):
+        for query in ('', '?from=2020-01-01'):
+            self.assertEqual(self.client.get('/income/async/income-source-summary' + query).json(),
+                             self.client.get('/income/income-source-summary' + query).json())
+        for text in ('pay', '2020-03'):
+            body = json.dumps({'searchText': text})
+            self.assertEqual(self.client.post('/income/async/search-income', body, content_type='application/json').json(),
+                             self.client.post('/income/search-income', body, content_type='application/json').json())
+
+        self.client.logout()
+        self.assertEqual(self.client.get('/income/async/income-source-summary').status_code, 302)
+        self.assertEqual(self.client.post('/income/async/search-income').status_code, 302)
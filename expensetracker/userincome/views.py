@@ -3,47 +3,75 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from .models import UserIncome, Source, TotalIncome
 from django.core.paginator import Paginator
+import itertools
 import json
 from django.http import JsonResponse, HttpResponse
-from userpreferences.models import UserPreference
 import datetime
-import csv
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete
+from django.db import router
+from django.db.models import DecimalField
+from django.db.models.functions import Cast
+from expenses import rollups
 from django.dispatch import receiver
+from expenses import importers
+from expenses.ratelimit import consume, limited_response
+from expenses.search import date_range, search_page, get_limit
+from expenses.pagination import keyset_page, get_page_size, PAGE_SIZES
+from expenses.utils import get_date_window, summarize_by, summarize_ledger, bucket_series, filter_export, export_start, csv_response, GRANULARITIES, EXPORT_CHUNK_SIZE
+from expenses.archive import archived_window, ledger
+from userpreferences.currencies import currency_code
+from userpreferences.fx import converted_amount
+from userpreferences.middleware import stored_currency
+from expenses.versioning import bump_version, conditional_on_data, conditional_on_date
+from expensetracker import sharding
+from expensetracker.routers import read_replica
+from expenses.resultcache import cached_result
 # Create your views here.
 
+@receiver(pre_save, sender=UserIncome)
+def snapshot_income(sender, instance, **kwargs):
+    rollups.before_save(instance, 'source')
+
 @receiver(post_save, sender=UserIncome)
 def update_total_income(sender, instance, **kwargs):
-    source = instance.source
-    amount = int(instance.amount)
-    owner = instance.owner
-    try:
-        total_income = TotalIncome.objects.get(source=source, owner=owner)
-        current_total = int(total_income.amount)
-        total_income.amount = current_total + amount
-        total_income.save()
-    except TotalIncome.DoesNotExist:
-        TotalIncome.objects.create(source=source, amount=amount, owner=owner)
+    rollups.after_save(TotalIncome, instance, 'source')
+
+@receiver(post_delete, sender=UserIncome)
+def remove_from_total_income(sender, instance, **kwargs):
+    rollups.after_delete(TotalIncome, instance, 'source')
+
+@receiver(post_save, sender=UserIncome)
+@receiver(post_delete, sender=UserIncome)
+def bump_income_version(sender, instance, using, **kwargs):
+    bump_version(instance.owner_id, using)
 
 
+@login_required(login_url='/authentication/login')
+@conditional_on_data
+@read_replica
 def search_income(request):
-    if request.method == 'POST':
-        search_str = json.loads(request.body).get('searchText')
-        income = UserIncome.objects.filter(amount__istartswith=search_str, owner=request.user) | UserIncome.objects.filter(date__istartswith=search_str, owner=request.user) | UserIncome.objects.filter(description__icontains=search_str, owner=request.user) | UserIncome.objects.filter(source__icontains=search_str, owner=request.user)
-        data = income.values()
-        return JsonResponse(list(data), safe=False)
+    if request.method in ('GET', 'POST'):
+        body = json.loads(request.body) if request.method == 'POST' else request.GET
+        search_str = body.get('searchText', '')
+        # A date search (2021, 2021-03, ...) reaching back past the archive horizon also lists archived rows.
+        archived = archived_window(UserIncome, request.user.pk, *(date_range(search_str) or (None, None)))
+        data = search_page(UserIncome.objects.filter(owner=request.user), ('description', 'source'), search_str,
+                           ('id', 'amount', 'currency', 'source', 'description', 'date'), get_limit(body.get('limit')), body.get('cursor'),
+                           archived)
+        return JsonResponse(data)
 
 @login_required(login_url='/authentication/login')
 def index(request):
-    sources = Source.objects.all()
     income = UserIncome.objects.filter(owner = request.user)
-    paginator = Paginator(income, 5)
-    page_number = request.GET.get('page')
-    page_obj = Paginator.get_page(paginator, page_number)
-    currency = UserPreference.objects.get(user= request.user).currency
+    try:
+        page_obj = keyset_page(income, request.GET.get('cursor'), get_page_size(request))
+    except ValueError:
+        page_obj = keyset_page(income, None, get_page_size(request))
+    currency = request.preferences.currency
     context = {
-        'income': income,
         'page_obj': page_obj,
+        'page_sizes': PAGE_SIZES,
+        'total': income.count() if request.GET.get('count') else None,
         'currency': currency
     }
     return render(request, "income/index.html",context)
@@ -75,11 +103,52 @@ def add_income(request):
             messages.error(request, "Description is required")
             return render(request, " income/add_income.html", context)
 
-        UserIncome.objects.create(owner=request.user, amount=amount, source=source, description=description, date=date)
+        with sharding.atomic(request.user.pk):
+            UserIncome.objects.create(owner=request.user, amount=amount, currency=stored_currency(request.user),
+                                      source=source, description=description, date=date)
         messages.success(request, 'Income added successfully.')
         
         return redirect('income')
 
+@login_required(login_url='/authentication/login')
+def import_income(request):
+    sources = Source.objects.all()
+    context = {
+        'sources': sources
+    }
+
+    if request.method == 'GET':
+        return render(request, "income/import.html", context)
+
+    if request.method == 'POST':
+        upload = request.FILES.get('statement')
+        if not upload:
+            messages.error(request, "Please choose a CSV or OFX file")
+            return render(request, "income/import.html", context)
+
+        retry_after = consume(request.user.pk, 'import')
+        if retry_after:
+            messages.error(request, 'Maximum number of imports reached for today')
+            return limited_response(render(request, "income/import.html", context), retry_after)
+
+        if upload.name.lower().endswith(('.ofx', '.qfx')):
+            rows = importers.parse_ofx(upload.file, income=True)
+        else:
+            rows = importers.parse_csv(upload.file, 'source')
+        try:
+            result = importers.import_rows(UserIncome, TotalIncome, 'source', request.user, rows, request.POST.get('source'),
+                                           stored_currency(request.user))
+        except importers.UnreadableFile as ex:
+            messages.error(request, str(ex))
+            return render(request, "income/import.html", context, status=400)
+
+        if result.created:
+            messages.success(request, f'Imported {result.created} income.')
+        if result.failed:
+            messages.error(request, f'{result.failed} rows were skipped.')
+        context['result'] = result
+        return render(request, "income/import.html", context)
+
 @login_required(login_url='/authentication/login')
 def edit_income(request, id):
     income = UserIncome.objects.get(pk=id)
@@ -103,73 +172,103 @@ def edit_income(request, id):
             messages.error(request, "Description is required")
             return render(request, "income/edit_income.htmll", context)
 
-        income.owner = request.user
-        income.amount = amount
-        income.description = description
-        income.source = source
-        income.date = date
-
-        income.save()
+        with sharding.atomic(request.user.pk) as db:
+            # Locked and re-read, see edit_expense.
+            income = UserIncome.objects.using(db).select_for_update().get(pk=id)
+            income.owner = request.user
+            income.amount = amount
+            income.description = description
+            income.source = source
+            income.date = date
+            income.save()
         messages.success(request, 'Income updated successfully.')
 
         return redirect('income')
 
 
 def delete_income(request, id):
-    income = UserIncome.objects.get(pk=id)
-    income.delete()
+    with sharding.atomic(request.user.pk) as db:
+        income = UserIncome.objects.using(db).select_for_update().get(pk=id)
+        income.delete()
     messages.success(request, 'Income removed.')
     return redirect('income')
 
+@login_required(login_url='/authentication/login')
+@conditional_on_date
+@read_replica
 def income_source_summary(request):
-    todays_date = datetime.date.today()
-    six_months_ago = todays_date - datetime.timedelta(days= 30*6)
-    incomes = UserIncome.objects.filter(owner = request.user, date__gte = six_months_ago, date__lte = todays_date)
+    try:
+        date_from, date_to = get_date_window(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date range, use ?from=YYYY-MM-DD&to=YYYY-MM-DD'}, status=400)
+    currency = currency_code(request.preferences.currency)
 
-    finalrep = {}
-    def get_source(income):
-        return income.source
+    def summarize():
+        incomes = ledger(UserIncome, request.user.pk, date_from, date_to)
+        unconverted = {}
+        return summarize_ledger(incomes, 'source', currency, unconverted), unconverted
 
-    def get_income_source_amount(source):
-        amount = 0
-        filtered_by_category = incomes.filter(source = source)
-        for item in filtered_by_category:
-            amount += item.amount
-        return amount
+    finalrep, unconverted = cached_result(request.user.pk, 'income_source_summary', (date_from, date_to, currency), summarize)
+    return JsonResponse({'income_source_data': finalrep, 'unconverted': unconverted}, safe= False)
 
-    source_list = list(set(map(get_source, incomes)))
+@login_required(login_url='/authentication/login')
+@conditional_on_date
+@read_replica
+def income_source_series(request):
+    granularity = request.GET.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        return JsonResponse({'error': 'granularity must be one of day, week, month'}, status=400)
+    try:
+        date_from, date_to = get_date_window(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date range, use ?from=YYYY-MM-DD&to=YYYY-MM-DD'}, status=400)
+    incomes = ledger(UserIncome, request.user.pk, date_from, date_to)
+    sources = request.GET.getlist('source')
+    if sources:
+        incomes = [part.filter(source__in = sources) for part in incomes]
+    return JsonResponse({'income_source_series': bucket_series(incomes, 'source', granularity, date_from, date_to,
+                                                               currency_code(request.preferences.currency))})
 
-    for income in incomes:
-        for source in source_list:
-            finalrep[source] = get_income_source_amount(source)
+@login_required(login_url='/authentication/login')
+@conditional_on_date
+@read_replica
+def stats_view(request):
+    currency = request.preferences.currency
 
-    return JsonResponse({'income_source_data': finalrep}, safe= False)
+    def summarize():
+        unconverted = {}
+        return summarize_by(TotalIncome.objects.filter(owner = request.user), 'source', currency_code(currency), unconverted), unconverted
 
-def stats_view(request):
-    total_income= TotalIncome.objects.filter(owner = request.user)
+    totals, unconverted = cached_result(request.user.pk, 'income_stats', (currency_code(currency),), summarize)
+    total_income = [{'source': key, 'amount': amount} for key, amount in sorted(totals.items())]
     paginator = Paginator(total_income, 5)
     page_number = request.GET.get('page')
     page_obj = Paginator.get_page(paginator, page_number)
-    if UserPreference.objects.filter(user= request.user).exists():
-        currency = UserPreference.objects.get(user= request.user).currency
-    else:
-        currency = 'INR'
     context = {
         'total_income': total_income,
         'page_obj': page_obj,
         'currency': currency,
+        'unconverted': unconverted,
     }
     return render(request, 'income/stats.html', context)
 
+@login_required(login_url='/authentication/login')
+@conditional_on_data
+@read_replica
 def export_csv(request):
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=Income'+str(datetime.datetime.now())+'.csv'
-    writer = csv.writer(response)
-    writer.writerow(['Amount', 'Description', 'Source', 'Date'])
-
-    incomes = UserIncome.objects.filter(owner =request.user)
-    for income in incomes:
-        writer.writerow([income.amount, income.description, income.source, income.date])
-
-    return response
\ No newline at end of file
+    try:
+        # The rows are streamed after the view returns, so fix the database now.
+        db = router.db_for_read(UserIncome)
+        incomes = [filter_export(request, UserIncome.objects.using(db).filter(owner =request.user), 'source')]
+        # An explicit ?from= before the archive horizon exports the archived rows after the live ones.
+        archived = archived_window(UserIncome, request.user.pk, export_start(request), None)
+        if archived is not None:
+            incomes.append(filter_export(request, archived.using(db), 'source'))
+    except ValueError:
+        return HttpResponse('Invalid date, use YYYY-MM-DD', status=400)
+    currency = currency_code(request.preferences.currency)
+    converted = Cast(converted_amount(currency), DecimalField(max_digits=20, decimal_places=2))
+    rows = itertools.chain.from_iterable(
+        part.annotate(converted=converted).values_list('amount', 'currency', 'converted', 'description', 'source', 'date')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE) for part in incomes)
+    return csv_response(request, 'Income', ['Amount', 'Currency', f'Amount ({currency})', 'Description', 'Source', 'Date'], rows)
\ No newline at end of file
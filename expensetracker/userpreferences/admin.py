@@ -1,2 +1,4 @@
 from django.contrib import admin
+from .models import ExchangeRate
 # Register your models here.
+admin.site.register(ExchangeRate)
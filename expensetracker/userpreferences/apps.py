@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UserpreferencesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'userpreferences'
+
+    def ready(self):
+        from .currencies import load_currencies
+        from . import fx  # noqa: F401, connects the rate cache invalidation receivers
+        load_currencies()
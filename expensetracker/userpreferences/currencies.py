@@ -0,0 +1,34 @@
+import hashlib
+import json
+import os
+from types import MappingProxyType
+from django.conf import settings
+
+DEFAULT_CURRENCY = 'INR'
+
+# Filled in by UserpreferencesConfig.ready(); code -> display name.
+CURRENCIES = MappingProxyType({})
+CURRENCY_CHOICES = ()
+CATALOGUE_HASH = ''
+
+
+def load_currencies():
+    global CURRENCIES, CURRENCY_CHOICES, CATALOGUE_HASH
+    file_path = os.path.join(settings.BASE_DIR, 'currencies.json')
+    with open(file_path, 'rb') as json_file:
+        raw = json_file.read()
+    CURRENCIES = MappingProxyType(json.loads(raw))
+    CURRENCY_CHOICES = tuple(MappingProxyType({'name': code, 'value': name}) for code, name in CURRENCIES.items())
+    CATALOGUE_HASH = hashlib.sha1(raw).hexdigest()
+
+
+def is_valid_currency(value):
+    # Preferences are stored as "<code> - <name>", the same text the <select> posts, or as the bare
+    # code new users get (DEFAULT_CURRENCY), which the page offers back as the selected option.
+    code, separator, name = value.partition(' - ')
+    return code in CURRENCIES and (not separator or CURRENCIES[code] == name)
+
+
+def currency_code(value):
+    # "<code> - <name>" from a UserPreference, or a bare code; unset means the default.
+    return (value or DEFAULT_CURRENCY).partition(' - ')[0]
@@ -0,0 +1,69 @@
+import hashlib
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Value, When
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import ExchangeRate
+
+FACTOR_PLACES = Decimal('0.0000000001')
+DEFAULT_MAX_AGE = 60
+
+# Process-local copy of the ExchangeRate table. The table is the only state processes share:
+# each one re-reads it FX_RATES_MAX_AGE seconds after loading it, and at once after a change it
+# saved itself. A stamp in a process-local cache would never reach the web workers.
+_rates = None
+_version = None
+_loaded_at = 0.0
+
+
+def get_rates():
+    """currency code -> units per one unit of the base currency."""
+    global _rates, _version, _loaded_at
+    if _rates is None or time.monotonic() - _loaded_at >= getattr(settings, 'FX_RATES_MAX_AGE', DEFAULT_MAX_AGE):
+        rates = dict(ExchangeRate.objects.values_list('currency', 'rate'))
+        # Derived from the contents, so processes holding the same table agree on ETags and result keys.
+        _version = hashlib.md5(repr(sorted(rates.items())).encode()).hexdigest()
+        _rates, _loaded_at = rates, time.monotonic()
+    return _rates
+
+
+def rates_version():
+    get_rates()
+    return _version
+
+
+def invalidate_rates():
+    global _rates
+    _rates = None
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def rates_changed(sender, **kwargs):
+    invalidate_rates()
+
+
+def conversion_factors(target):
+    """Multiplier per source currency that turns an amount into ``target``.
+
+    Currencies without a rate (or any currency when ``target`` has none) are left out.
+    """
+    rates = get_rates()
+    factors = {target: Decimal(1)}
+    if target in rates:
+        for code, rate in rates.items():
+            factors.setdefault(code, (rates[target] / rate).quantize(FACTOR_PLACES))
+    return factors
+
+
+def converted_amount(target, amount='amount', currency='currency'):
+    """``amount`` expressed in ``target`` as a SQL expression, NULL when no rate is known.
+
+    The factors are inlined as a CASE on the currency column so totals stay a single
+    aggregate query over the rows instead of a conversion per row in Python.
+    """
+    factors = conversion_factors(target)
+    factor = Case(*[When(**{currency: code}, then=Value(value)) for code, value in factors.items()], default=None)
+    return ExpressionWrapper(F(amount) * factor, output_field=DecimalField())
@@ -0,0 +1,41 @@
+import json
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from userpreferences.fx import invalidate_rates
+from userpreferences.models import ExchangeRate
+
+
+class Command(BaseCommand):
+    help = 'Replace the exchange rate table from a JSON file shaped like {"base": "USD", "rates": {"INR": "83.12", ...}}'
+
+    def add_arguments(self, parser):
+        # No rate file ships with the project, the rates have to come from somewhere current.
+        parser.add_argument('path', help='JSON rate file to load')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path']) as rates_file:
+                data = json.load(rates_file)
+        except (OSError, ValueError) as ex:
+            raise CommandError(f"Could not read {options['path']}: {ex}")
+
+        rates = {data['base']: Decimal(1)} if data.get('base') else {}
+        for code, rate in data.get('rates', {}).items():
+            try:
+                rate = Decimal(str(rate))
+            except InvalidOperation:
+                raise CommandError(f'Rate for {code} is not a number: {rate!r}')
+            if rate <= 0:
+                raise CommandError(f'Rate for {code} must be positive')
+            rates[code.upper()] = rate
+        if not rates:
+            raise CommandError('No rates found in the file')
+
+        with transaction.atomic():
+            ExchangeRate.objects.all().delete()
+            ExchangeRate.objects.bulk_create(ExchangeRate(currency=code, rate=rate) for code, rate in rates.items())
+            # bulk_create skips post_save, so drop this process's copy explicitly; the web
+            # processes re-read the table within FX_RATES_MAX_AGE seconds.
+            transaction.on_commit(invalidate_rates)
+        self.stdout.write(f'Loaded {len(rates)} exchange rates')
@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+from .currencies import DEFAULT_CURRENCY, currency_code
+from .models import UserPreference
+
+CACHE_TIMEOUT = 60*60
+
+
+def cache_key(user_id):
+    return f'userpreferences:{user_id}'
+
+
+def get_preferences(user):
+    """The user's UserPreference, from the cache when possible.
+
+    Users without a row get an unsaved instance carrying the default currency.
+    """
+    key = cache_key(user.pk)
+    preferences = cache.get(key)
+    if preferences is None:
+        preferences = UserPreference.objects.filter(user=user).first()
+        if preferences is None:
+            preferences = UserPreference(user_id=user.pk, currency=DEFAULT_CURRENCY)
+        cache.set(key, preferences, CACHE_TIMEOUT)
+    return preferences
+
+
+def stored_currency(user):
+    """The user's currency code straight from the database, for rows about to be saved.
+
+    get_preferences may answer from a cache entry another worker has not invalidated yet;
+    that is fine for display but an amount saved under the wrong currency stays wrong.
+    """
+    return currency_code(UserPreference.objects.filter(user=user).values_list('currency', flat=True).first())
+
+
+@receiver(post_save, sender=UserPreference)
+@receiver(post_delete, sender=UserPreference)
+def invalidate_preferences(sender, instance, **kwargs):
+    cache.delete(cache_key(instance.user_id))
+
+
+class PreferenceMiddleware:
+    """Expose request.preferences, resolved at most once per request and only if used."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.preferences = SimpleLazyObject(lambda: get_preferences(request.user) if request.user.is_authenticated else None)
+        return self.get_response(request)
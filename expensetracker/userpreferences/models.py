@@ -3,8 +3,18 @@ from django.contrib.auth.models import User
 # Create your models here.
 
 class UserPreference(models.Model):
-    user = models.OneToOneField(to=User, on_delete=models.CASCADE)
+    user = models.OneToOneField(to=User, on_delete=models.CASCADE, db_constraint=False)
     currency = models.CharField(max_length=255, blank= True, null= True)
 
     def __str__(self) -> str:
         return str(self.user)+"'s"+" preferences"
+
+
+class ExchangeRate(models.Model):
+    # Units of this currency per one unit of the file's base currency; see load_fx_rates.
+    currency = models.CharField(max_length=3, unique=True)
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'{self.currency} {self.rate}'
@@ -1,3 +1,91 @@
-from django.test import TestCase
+from decimal import Decimal
+import datetime
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from expenses.models import Expense
+from expenses.utils import summarize_by
+from userincome.models import UserIncome
+from .middleware import cache_key
+from .models import ExchangeRate, UserPreference
+from . import fx
 
 # Create your tests here.
+
+class ExchangeRateTests(TestCase):
+
+    def setUp(self):
+        fx.invalidate_rates()
+        ExchangeRate.objects.create(currency='USD', rate=1)
+        ExchangeRate.objects.create(currency='INR', rate=80)
+        self.user = User.objects.create_user('fx', 'fx@example.com', 'secret')
+        for amount, currency, category in [('80', 'INR', 'Food'), ('1', 'USD', 'Food'), ('5', 'GBP', 'Rent')]:
+            Expense.objects.create(owner=self.user, amount=amount, currency=currency, category=category, description='x')
+
+    def test_summary_converts_and_skips_unknown_currencies(self):
+        expenses = Expense.objects.filter(owner=self.user)
+        self.assertEqual(summarize_by(expenses, 'category', 'USD'), {'Food': Decimal('2.00')})
+        self.assertEqual(summarize_by(expenses, 'category', 'INR'), {'Food': Decimal('160.00')})
+        self.assertEqual(summarize_by(expenses, 'category'), {'Food': Decimal('81.00'), 'Rent': Decimal('5.00')})
+
+    def test_rates_are_cached_until_invalidated(self):
+        fx.get_rates()
+        with CaptureQueriesContext(connection) as queries:
+            fx.get_rates()
+        self.assertEqual(len(queries), 0)
+
+        ExchangeRate.objects.create(currency='GBP', rate='0.5')
+        self.assertEqual(fx.get_rates()['GBP'], Decimal('0.5'))
+        self.assertEqual(summarize_by(Expense.objects.filter(owner=self.user), 'category', 'USD'),
+                         {'Food': Decimal('2.00'), 'Rent': Decimal('10.00')})
+
+    def test_unconverted_amounts_are_reported_per_currency(self):
+        unconverted = {}
+        self.assertEqual(summarize_by(Expense.objects.filter(owner=self.user), 'category', 'USD', unconverted),
+                         {'Food': Decimal('2.00')})
+        self.assertEqual(unconverted, {'GBP': Decimal('5.00')})
+
+    def test_rates_loaded_elsewhere_are_picked_up_after_max_age(self):
+        fx.get_rates()
+        version = fx.rates_version()
+        # A queryset update sends no signal, like a rate loaded by another process.
+        ExchangeRate.objects.filter(currency='INR').update(rate=40)
+        self.assertEqual(fx.get_rates()['INR'], Decimal('80'))
+        with override_settings(FX_RATES_MAX_AGE=0):
+            self.assertEqual(fx.get_rates()['INR'], Decimal('40'))
+        self.assertNotEqual(fx.rates_version(), version)
+
+
+class PreferenceFormTests(TestCase):
+
+    def test_default_currency_posts_back_unchanged(self):
+        user = User.objects.create_user('prefs', 'prefs@example.com', 'secret')
+        self.client.force_login(user)
+        self.assertEqual(UserPreference.objects.get(user=user).currency, 'INR')
+        self.assertContains(self.client.get('/preferences/'), '<option value="INR" selected>')
+        self.assertEqual(self.client.post('/preferences/', {'currency': 'INR'}).status_code, 200)
+        self.assertEqual(self.client.post('/preferences/', {'currency': 'XYZ'}).status_code, 400)
+        self.assertEqual(self.client.post('/preferences/', {'currency': 'INR - Nope'}).status_code, 400)
+
+    def test_writes_use_the_stored_currency_over_a_stale_cache_entry(self):
+        user = User.objects.create_user('stale', 'stale@example.com', 'secret')
+        self.client.force_login(user)
+        self.client.get('/preferences/')
+        # Another worker saved the change; this one still holds the old preferences.
+        UserPreference.objects.filter(user=user).update(currency='USD - United States Dollar')
+        self.assertEqual(cache.get(cache_key(user.pk)).currency, 'INR')
+        self.client.post('/add-expense', {'amount': '2.50', 'description': 'tea', 'category': 'Food',
+                                          'expense_date': datetime.date.today().isoformat()})
+        self.client.post('/income/add-income', {'amount': '9.00', 'description': 'pay', 'source': 'Salary',
+                                                'income_date': datetime.date.today().isoformat()})
+        self.assertEqual(Expense.objects.get(owner=user).currency, 'USD')
+        self.assertEqual(UserIncome.objects.get(owner=user).currency, 'USD')
+
+
+class PreferenceAccessTests(TestCase):
+
+    def test_anonymous_users_are_redirected(self):
+        for path in ('/preferences/', '/stats', '/income/stats'):
+            self.assertRedirects(self.client.get(path), '/authentication/login?next=' + path, fetch_redirect_response=False)
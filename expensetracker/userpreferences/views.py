@@ -1,33 +1,30 @@
 from django.shortcuts import render
-import os
-import json
-from django.conf import settings
-from .models import UserPreference
 from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from expensetracker import sharding
+from . import currencies
+from .models import UserPreference
 # Create your views here.
 
+@login_required(login_url='/authentication/login')
 def index(request):
-    currency_data = []
-    file_path = os.path.join(settings.BASE_DIR,'currencies.json')
-    with open(file_path, 'r') as json_file:
-        data = json.load(json_file)
-        for k,v in data.items():
-            currency_data.append({'name': k, 'value': v})
-    exist = UserPreference.objects.filter(user= request.user).exists()
-
-    user_preferences = None
-    if exist:
-        user_preferences = UserPreference.objects.get(user= request.user)
+    user_preferences = request.preferences
+    context = {
+        'currencies': currencies.CURRENCY_CHOICES,
+        'catalogue_hash': currencies.CATALOGUE_HASH,
+        'user_preferences': user_preferences,
+    }
 
     if request.method == 'GET':
-        return render(request, 'preferences/index.html',{'currencies': currency_data,'user_preferences': user_preferences})
+        return render(request, 'preferences/index.html', context)
 
     else:
-        currency = request.POST['currency']
-        if exist:
-            user_preferences.currency = currency
-            user_preferences.save()
-        else:
-            UserPreference.objects.create(user = request.user, currency = currency)
+        currency = request.POST.get('currency', '')
+        if not currencies.is_valid_currency(currency):
+            messages.error(request, 'Please choose a currency from the list')
+            return render(request, 'preferences/index.html', context, status=400)
+        # Not save(): the cached instance may carry a row id from before a shard move.
+        with sharding.atomic(request.user.pk):
+            context['user_preferences'] = UserPreference.objects.update_or_create(user=request.user, defaults={'currency': currency})[0]
         messages.success(request, 'Changes saved')
-        return render(request, 'preferences/index.html',{'currencies': currency_data,'user_preferences': user_preferences})
\ No newline at end of file
+        return render(request, 'preferences/index.html', context)
\ No newline at end of file